@@ -1,39 +1,93 @@
 #!/usr/bin/env python3
 
+import logging
+import datetime
+import numpy as np
+from run_logs import parseRuns, phaseDurations, groupRuns, summary, RunStore
+
+
+def parse():
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Profile experiment runs from logs")
+
+	parser.add_argument("--logs", dest="logs", metavar="logs", type=str, nargs='+', default=[f"../../dp-oram-paper.wiki/{wiki}.md" for wiki in ["Experiments-Full", "Experiments"]], help=f"Log files (wiki pages or bin/main logs) to profile.")
+	parser.add_argument("--group-by", dest="groupBy", metavar="group-by", type=str, nargs='+', default=None, help=f"Parameters to group runs by (all parameters by default).")
+	parser.add_argument("--store", dest="store", metavar="store", type=str, default=None, help=f"SQLite run store; logs are ingested incrementally (only appended bytes are parsed) and reports come from the store.")
+	parser.add_argument("--weekly", dest="weekly", default=False, help="Report machine-hours per week (needs --store)", action="store_true")
+	parser.add_argument("--per-parameter", dest="perParameter", metavar="per-parameter", type=str, default=None, help=f"Report machine-hours per value of this parameter (needs --store).")
+	parser.add_argument("--top", dest="top", metavar="top", type=int, default=10, help=f"The number of slowest configurations to report.")
+
+	parser.add_argument("-v", "--verbose", dest="verbose", default=False, help="increase output verbosity", action="store_true")
+
+	args = parser.parse_args()
+
+	logging.basicConfig(
+		level=logging.DEBUG if args.verbose else logging.INFO,
+		format='%(asctime)s %(levelname)-8s %(message)s',
+		datefmt='%a, %d %b %Y %H:%M:%S',
+	)
+
+	if (args.weekly or args.perParameter is not None) and args.store is None:
+		parser.error("--weekly and --per-parameter need --store")
+
+	return args.logs, args.groupBy, args.store, args.weekly, args.perParameter, args.top
+
+
+def report(runs, groupBy, top):
+	print(f"{'Phase':<40}{'runs':>8}{'mean':>12}{'median':>12}{'p90':>12}{'max':>12}{'total':>16}")
+	for name, durations in sorted(phaseDurations(runs).items(), key=lambda item: -item[1].sum()):
+		stats = summary(durations)
+		print(f"{name[:39]:<40}{stats['count']:>8}{stats['mean']:>12.1f}{stats['median']:>12.1f}{stats['p90']:>12.1f}{stats['max']:>12.1f}{str(datetime.timedelta(seconds=stats['total'])):>16}")
+	print()
+
+	groups = groupRuns(runs, groupBy)
+	slowest = sorted(groups.items(), key=lambda item: -np.mean([run["end"] - run["start"] for run in item[1]]))[:top]
+
+	print(f"Slowest configurations (mean run time, runs):")
+	for parameters, group in slowest:
+		mean = np.mean([run["end"] - run["start"] for run in group])
+		print(f"{str(datetime.timedelta(seconds=int(mean))):>12}{len(group):>6}  {', '.join(f'{key}={value}' for key, value in parameters) or '(no parameters)'}")
+	print()
+
+
 def main():
 
-	import datetime
-	import re
-	processor = re.compile("\[(\d+)/(\d+)/(\d+) (\d+):(\d+):(\d+)\]")
-	
-	def extractDate(line):
-		match = processor.search(line)
-		day = match.group(1)
-		month = match.group(2)
-		year = match.group(3)
-		hour = match.group(4)
-		minute = match.group(5)
-		second = match.group(6)
-		return datetime.datetime(year=int(year), month=int(month), day=int(day), hour=int(hour), minute=int(minute), second=int(second))
-	
-	for wiki in ["Experiments-Full", "Experiments"]:
-		start = None
-		total = datetime.timedelta(0)
-		with open(f"../../dp-oram-paper.wiki/{wiki}.md") as fp:
-			while True:
-				line = fp.readline() 
-				if not line:
-					break
-
-				if "INFO: Generating indices..." in line:
-					start = extractDate(line)
-				
-				if "INFO: Log written to" in line:
-					end = extractDate(line)
-					elapsed = end-start
-					total += elapsed
-		
-		print(f"{wiki}: {total}")
+	logs, groupBy, store, weekly, perParameter, top = parse()
+
+	if store is not None:
+		store = RunStore(store)
+		for log in logs:
+			logging.info(f"{log}: ingested {store.ingest(log)} new runs")
+
+		if weekly:
+			print("Machine-hours per week:")
+			for week, hours, runs in store.hoursPerWeek():
+				print(f"{week:>10}{hours:>10.2f}{runs:>8} runs")
+			print()
+		if perParameter is not None:
+			print(f"Machine-hours per {perParameter}:")
+			for value, hours, runs in store.hoursPerParameter(perParameter):
+				print(f"{value:>10}{hours:>10.2f}{runs:>8} runs")
+			print()
+
+		report(store.runs(), groupBy, top)
+		store.close()
+		return
+
+	allRuns = []
+	for log in logs:
+		runs = list(parseRuns(log))
+		total = sum(run["end"] - run["start"] for run in runs)
+		logging.debug(f"{log}: {len(runs)} runs")
+
+		print(f"{log}: {datetime.timedelta(seconds=total)} ({total / 3600:.2f} machine-hours, {len(runs)} runs)")
+		allRuns += runs
+	print()
+
+	if len(allRuns) > 0:
+		report(allRuns, groupBy, top)
+
 
 if __name__ == "__main__":
 	main()
@@ -52,6 +52,9 @@ def parse():
 	parser.add_argument("--skip-insert", dest="skipInsert", default=False, help="Skip INSERT stage", action="store_true")
 	parser.add_argument("--skip-queries", dest="skipQueries", default=False, help="Skip QUERIES stage", action="store_true")
 
+	parser.add_argument("--telemetry", dest="telemetry", metavar="interval", type=float, default=None, help=f"Sample CPU, RSS, faults, context switches and I/O of each stage at this interval in seconds.")
+	parser.add_argument("--telemetry-pids", dest="telemetryPids", metavar="pid", type=int, nargs='+', default=None, help=f"Processes to sample with their workers, such as a local database server (this script by default).")
+
 	args = parser.parse_args()
 
 	logging.basicConfig(
@@ -60,7 +63,32 @@ def parse():
 		datefmt='%a, %d %b %Y %H:%M:%S',
 	)
 
-	return args.engine, args.recordSize, args.count, args.queries, args.batch, args.dataset, args.queryset, args.password, args.host, args.skipInsert, args.skipQueries
+	return args.engine, args.recordSize, args.count, args.queries, args.batch, args.dataset, args.queryset, args.password, args.host, args.skipInsert, args.skipQueries, args.telemetry, args.telemetryPids
+
+
+def startTelemetry(interval, pids):
+	if interval is None:
+		return None
+
+	import os
+	from telemetry import Sampler
+
+	sampler = Sampler(pids if pids is not None else [os.getpid()], interval)
+	sampler.start()
+	return sampler
+
+
+def stopTelemetry(sampler, stage):
+	if sampler is None:
+		return
+
+	sampler.stop()
+	# the counters are what the stage added, not totals since the processes started
+	summary = sampler.summary()
+	if len(summary) == 0:
+		logging.warning(f"No telemetry samples for {stage}")
+		return
+	logging.info(f"{stage} telemetry: CPU peak {summary['cpuPeak']:.2f} mean {summary['cpuMean']:.2f} cores, RSS peak {summary['rssPeak'] / 2**20:.1f} mean {summary['rssMean'] / 2**20:.1f} MB, {summary['majorFaults']} major faults, {summary['contextSwitches']} context switches, {summary['readBytes']} B read, {summary['writeBytes']} B written")
 
 
 def main():
@@ -68,7 +96,7 @@ def main():
 	import statistics
 	import string
 
-	engine, recordSize, count, queries, batch, dataset, queryset, password, host, skipInsert, skipQueries = parse()
+	engine, recordSize, count, queries, batch, dataset, queryset, password, host, skipInsert, skipQueries, telemetry, telemetryPids = parse()
 
 	import psycopg2
 	import psycopg2.extras
@@ -126,6 +154,7 @@ Queryset: {queryset}
 			connection.commit()
 
 			logging.info("Created table and index, inserting dataset")
+			sampler = startTelemetry(telemetry, telemetryPids)
 			beforeInsertTime = time.time()
 
 			toInsert = []
@@ -159,6 +188,7 @@ Queryset: {queryset}
 							break
 
 			beforeQueriesTime = time.time()
+			stopTelemetry(sampler, "INSERT")
 
 			logging.info(f"Finished inserting in {int((beforeQueriesTime - beforeInsertTime) * 1000)} ms.")
 
@@ -166,6 +196,7 @@ Queryset: {queryset}
 			logging.info("Will do queries.")
 
 			overheads = []
+			sampler = startTelemetry(telemetry, telemetryPids)
 			with open(queryset, "r") as querysetFile:
 				line = querysetFile.readline()
 				while line:
@@ -184,6 +215,7 @@ Queryset: {queryset}
 					line = querysetFile.readline()
 					if len(overheads) == queries:
 						break
+			stopTelemetry(sampler, "QUERIES")
 
 			logging.info(f"Average query time: {statistics.mean(overheads) :.3f} ms")
 
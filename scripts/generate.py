@@ -7,13 +7,27 @@ import math
 import string
 import random
 import logging
+import sys
+import time
+import resource
+from contextlib import contextmanager
 from enum import Enum, auto
+from sidecar import writeSidecar, answerSizes
+
+CHUNK = 2**20
+WRITE_CHUNK = 2**16
+# rejection samplers give up after this many rounds, e.g. for a hot range outside the data
+MAX_DRAWS = 1000
 
 
 class Dataset(Enum):
 	CA = auto()
 	PUMS = auto()
 	UNIFORM = auto()
+	ZIPF = auto()
+	LOGNORMAL = auto()
+	MIXTURE = auto()
+	HOTRANGE = auto()
 
 	def __str__(self):
 		return self.name
@@ -26,6 +40,22 @@ class Dataset(Enum):
 			raise ValueError()
 
 
+class Arrival(Enum):
+	POISSON = auto()
+	BURSTY = auto()
+	DIURNAL = auto()
+
+	def __str__(self):
+		return self.name
+
+	@staticmethod
+	def from_string(s):
+		try:
+			return Arrival[s]
+		except KeyError:
+			raise ValueError()
+
+
 def parse():
 	import argparse
 
@@ -39,8 +69,26 @@ def parse():
 	parser.add_argument("--min", dest="min", metavar="min", type=int, required=False, default=0, help=f"Min element for uniform generation.")
 	parser.add_argument("--max", dest="max", metavar="max", type=int, required=False, default=10**6, help=f"Max element for uniform generation.")
 
+	parser.add_argument("--skew", dest="skew", metavar="skew", type=float, required=False, default=1.0, help=f"Exponent for ZIPF, sigma for LOGNORMAL generation.")
+	parser.add_argument("--components", dest="components", metavar="components", type=int, required=False, default=3, help=f"Number of normal components for MIXTURE generation.")
+	parser.add_argument("--hot-ranges", dest="hotRanges", metavar="left:right:weight", type=parseHotRange, nargs='+', required=False, default=[], help=f"Hot ranges for HOTRANGE generation and hot queries; the rest of the mass is uniform.")
+	parser.add_argument("--hot-fraction", dest="hotFraction", metavar="hot-fraction", type=float, required=False, default=0.0, help=f"Fraction of queries aimed at hot regions. 0 to skip hot querysets.")
+
+	parser.add_argument("--trace-size", dest="traceSize", metavar="trace-size", type=int, required=False, default=0, help=f"The number of events in timed query traces. 0 to skip traces.")
+	parser.add_argument("--arrivals", dest="arrivals", metavar="arrivals", type=lambda arrival: Arrival[arrival], choices=list(Arrival), nargs='+', required=False, default=[Arrival.POISSON], help=f"Arrival processes for traces.")
+	parser.add_argument("--rate", dest="rate", metavar="rate", type=float, required=False, default=100.0, help=f"Mean arrival rate of traces in queries per second.")
+	parser.add_argument("--locality", dest="locality", metavar="locality", type=float, required=False, default=0.0, help=f"Probability that a trace query reuses a recent range.")
+	parser.add_argument("--locality-window", dest="localityWindow", metavar="locality-window", type=int, required=False, default=16, help=f"How many recent queries a reused range is picked from.")
+	parser.add_argument("--locality-shift", dest="localityShift", metavar="locality-shift", type=float, required=False, default=0.0, help=f"Max shift of a reused range as a fraction of its width.")
+
+	parser.add_argument("--attributes", dest="attributes", metavar="attributes", type=int, required=False, default=1, help=f"The number of correlated attributes. More than 1 also writes a multi-attribute dataset with joint selectivity queries.")
+	parser.add_argument("--correlation", dest="correlation", metavar="correlation", type=float, required=False, default=0.0, help=f"Pairwise correlation of the Gaussian copula joining the attributes.")
+
+	parser.add_argument("--sidecar-buckets", dest="sidecarBuckets", metavar="sidecar-buckets", type=int, required=False, default=65536, help=f"The number of buckets in the sidecar index written next to the dataset. 0 to skip the sidecar.")
+
 	parser.add_argument("--crop", dest="crop", action="store_true", help=f"Whether to crop index according to min and max.")
 	parser.add_argument("--hist", dest="hist", action="store_true", help=f"Whether to plot histogram.")
+	parser.add_argument("--cents", dest="cents", action="store_true", help=f"Whether to store values as integer cents (halves memory of the rounding stage).")
 
 	parser.add_argument("-s", "--selectivities", dest="selectivities", nargs='+', help="Selectivities as percents", required=True)
 	parser.add_argument("-r", "--ranges", dest="ranges", nargs='+', help="Ranges", required=True)
@@ -50,6 +98,11 @@ def parse():
 
 	args = parser.parse_args()
 
+	if args.dataset not in [Dataset.CA, Dataset.PUMS]:
+		for left, right, _ in args.hotRanges:
+			if left < args.min or right > args.max:
+				parser.error(f"Hot range {left}:{right} is not within [{args.min}, {args.max})")
+
 	logging.basicConfig(
 		level=logging.DEBUG if args.verbose else logging.INFO,
 		format='%(asctime)s %(levelname)-8s %(message)s',
@@ -59,7 +112,60 @@ def parse():
 	random.seed(args.seed)
 	np.random.seed(args.seed + 1)
 
-	return args.size, args.bins, args.dataset, args.pums, args.min, args.max, args.crop, args.hist, args.selectivities, args.ranges
+	return args.size, args.bins, args.dataset, args.pums, args.min, args.max, args.skew, args.components, args.hotRanges, args.hotFraction, args.traceSize, args.arrivals, args.rate, args.locality, args.localityWindow, args.localityShift, args.attributes, args.correlation, args.sidecarBuckets, args.crop, args.hist, args.cents, args.selectivities, args.ranges
+
+
+def parseHotRange(value):
+	left, right, weight = value.split(":")
+	if float(left) >= float(right) or float(weight) <= 0.0:
+		raise ValueError()
+	return float(left), float(right), float(weight)
+
+
+def memoryStatus():
+	"""
+	Current and peak RSS in MB from /proc/self/status, or None where there is no /proc.
+	"""
+	try:
+		with open("/proc/self/status") as status:
+			fields = {line.split(":")[0]: int(line.split()[1]) / 1024 for line in status if line.startswith(("VmRSS:", "VmHWM:"))}
+		return fields["VmRSS"], fields["VmHWM"]
+	except (OSError, KeyError):
+		return None
+
+
+def processPeak():
+	# ru_maxrss is in bytes on macOS and in kilobytes on Linux
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+@contextmanager
+def stage(name):
+	"""
+	Logs the time and RSS of a stage. Linux resets the peak RSS when 5 is written to /proc/self/clear_refs, so the peak is the stage's own;
+	elsewhere only the process peak is known, which is the stage's peak only if the stage raised it.
+	"""
+	try:
+		with open("/proc/self/clear_refs", "w") as clear:
+			clear.write("5")
+		reset = True
+	except OSError:
+		reset = False
+	before = memoryStatus()
+	peakBefore = processPeak()
+
+	start = time.time()
+	yield
+	elapsed = time.time() - start
+
+	after = memoryStatus()
+	if reset and after is not None:
+		peak = f"{after[1]:9.1f}"
+	else:
+		peak = processPeak()
+		peak = f"{peak:9.1f}" if peak > peakBefore else f"<={peak:7.1f}"
+	rss = f", RSS {before[0]:9.1f} -> {after[0]:9.1f} MB" if before is not None and after is not None else ""
+	logging.info(f"Stage {name:<10} took {elapsed:8.3f} s{rss}, peak RSS {peak} MB")
 
 
 def histogram(index, bins, filename, cropped):
@@ -104,6 +210,11 @@ def make_plot(title, hist, edges, x, pdf, count):
 
 
 def changeSize(index, n, bins=10000):
+	"""
+	Resizes a float64 buffer to n elements.
+	Contraction shuffles in place and returns a copy of the first n (a view would keep the whole buffer alive),
+	expansion fills a single preallocated buffer bin by bin.
+	"""
 	if n == -1 or n == len(index):
 		return index
 	if len(index) < n:
@@ -111,23 +222,383 @@ def changeSize(index, n, bins=10000):
 
 		hist, bins = np.histogram(index, density=False, bins=bins)
 		coefficient = float(n) / float(len(index))
+		counts = (coefficient * hist).astype(np.int64)
 
-		newBins = np.array([])
+		expanded = np.empty(counts.sum(), dtype=np.float64)
 
-		for i in range(len(hist)):
-			newBins = np.append((bins[i + 1] - bins[i]) * np.random.rand(int(coefficient * hist[i])) + bins[i], newBins)
+		offset = 0
+		for i in range(len(counts)):
+			expanded[offset:offset + counts[i]] = np.random.rand(counts[i])
+			expanded[offset:offset + counts[i]] *= bins[i + 1] - bins[i]
+			expanded[offset:offset + counts[i]] += bins[i]
+			offset += counts[i]
 
-		return newBins
+		return expanded
 	elif len(index) > n:
 		logging.debug("Contracting")
 
-		return index.sample(frac=float(n) / len(index), random_state=random.randrange(4 * 10**6))
+		np.random.shuffle(index)
+		return index[:n].copy()
+
+
+def addNoise(index):
+	for start in range(0, len(index), CHUNK):
+		index[start:start + CHUNK] += np.random.rand(len(index[start:start + CHUNK]))
+
+	return index
+
+
+def toCents(index):
+	"""
+	Converts a float64 buffer to int64 cents reusing the same memory (both types are 8 bytes wide).
+	"""
+	cents = index.view(np.int64)
+	for start in range(0, len(index), CHUNK):
+		chunk = index[start:start + CHUNK]
+		np.multiply(chunk, 100, out=chunk)
+		np.rint(chunk, out=chunk)
+		cents[start:start + CHUNK] = chunk
+
+	return cents
+
+
+def writeIndex(index, filename, scale):
+	with open(filename, "w") as out:
+		for start in range(0, len(index), WRITE_CHUNK):
+			chunk = index[start:start + WRITE_CHUNK].tolist()
+			if scale != 1:
+				chunk = [value / scale for value in chunk]
+			out.write("".join(f"{record}\n" for record in chunk))
 
 
 def generateUniform(size, _min, _max):
 	return np.random.uniform(low=float(_min), high=float(_max), size=size)
 
 
+def generateZipf(size, _min, _max, exponent):
+	"""
+	Bounded Zipf over the integer domain [_min, _max), rank 1 (the hottest value) at _min.
+	Sampled by inverse CDF, so the domain, not the exponent, bounds the cost.
+	"""
+	cdf = np.cumsum(np.arange(1, int(_max) - int(_min) + 1, dtype=np.float64)**-exponent)
+	cdf /= cdf[-1]
+
+	ranks = np.searchsorted(cdf, np.random.rand(size), side="right")
+	np.minimum(ranks, len(cdf) - 1, out=ranks)
+
+	return ranks.astype(np.float64) + _min
+
+
+def generateBounded(size, _min, _max, sampler):
+	"""
+	Draws from sampler(count) until size values fall into [_min, _max), resampling only the rejected tail.
+	Raises ValueError if that takes more than MAX_DRAWS rounds.
+	"""
+	result = np.empty(size, dtype=np.float64)
+	filled = 0
+	draws = 0
+	while filled < size:
+		if draws == MAX_DRAWS:
+			raise ValueError(f"Only {filled} of {size} values fell into [{_min}, {_max}) in {MAX_DRAWS} rounds")
+		draws += 1
+		sample = sampler(size - filled)
+		sample = sample[(sample >= _min) & (sample < _max)]
+		result[filled:filled + len(sample)] = sample
+		filled += len(sample)
+
+	return result
+
+
+def generateLognormal(size, _min, _max, sigma):
+	"""
+	Lognormal with median at a tenth of the domain, shifted to _min.
+	"""
+	mu = math.log((_max - _min) / 10)
+
+	return generateBounded(size, _min, _max, lambda count: np.random.lognormal(mean=mu, sigma=sigma, size=count) + _min)
+
+
+def generateMixture(size, _min, _max, components):
+	"""
+	Mixture of normals with random centers, widths of at most a tenth of the domain and Dirichlet weights.
+	"""
+	domain = _max - _min
+	centers = np.random.uniform(_min, _max, size=components)
+	widths = np.random.uniform(domain / 100, domain / 10, size=components)
+	weights = np.random.dirichlet(np.ones(components))
+
+	def sampler(count):
+		component = np.random.choice(components, size=count, p=weights)
+		return np.random.normal(loc=centers[component], scale=widths[component])
+
+	return generateBounded(size, _min, _max, sampler)
+
+
+def generateHotRanges(size, _min, _max, hotRanges):
+	"""
+	Each hot range (left, right, weight) receives weight of the mass uniformly, the remainder is uniform over [_min, _max).
+	"""
+	lefts = np.array([_min] + [hot[0] for hot in hotRanges], dtype=np.float64)
+	rights = np.array([_max] + [hot[1] for hot in hotRanges], dtype=np.float64)
+	weights = np.array([0.0] + [hot[2] for hot in hotRanges], dtype=np.float64)
+
+	if weights.sum() > 1.0:
+		raise ValueError("Hot range weights must sum to at most 1")
+	weights[0] = 1.0 - weights.sum()
+
+	component = np.random.choice(len(weights), size=size, p=weights)
+	result = np.random.rand(size)
+	result *= rights[component] - lefts[component]
+	result += lefts[component]
+
+	return result
+
+
+def hotRegions(index, bins, hotRanges, mass=0.5):
+	"""
+	Returns (lefts, rights, weights) of hot regions: the configured hot ranges if any,
+	otherwise the densest histogram bins holding the given mass.
+	"""
+	if len(hotRanges) > 0:
+		lefts = np.array([hot[0] for hot in hotRanges], dtype=np.float64)
+		rights = np.array([hot[1] for hot in hotRanges], dtype=np.float64)
+		weights = np.array([hot[2] for hot in hotRanges], dtype=np.float64)
+	else:
+		hist, edges = np.histogram(index, bins=bins)
+		order = np.argsort(hist)[::-1]
+		top = order[:np.searchsorted(np.cumsum(hist[order]), mass * len(index)) + 1]
+		lefts, rights, weights = edges[top], edges[top + 1], hist[top].astype(np.float64)
+
+	return lefts, rights, weights / weights.sum()
+
+
+def queryPairs(index, candidates, selectivity=0.0, _range=0, scale=1):
+	"""
+	Vectorized getRightEndpoint: returns an (n, 2) array of valid queries for candidate left endpoints, dropping the invalid ones.
+	Left endpoints are whole multiples of scale (whole dollars when the index is in cents).
+	"""
+	candidates = candidates.astype(np.int64) // scale * scale
+	if selectivity > 0.0:
+		endpoints = np.searchsorted(index, candidates) + int((len(index) / 100) * selectivity)
+		valid = endpoints < len(index)
+		return np.column_stack((candidates[valid], index[endpoints[valid]]))
+	else:
+		valid = candidates + _range < index[-1]
+		return np.column_stack((candidates[valid], candidates[valid] + _range))
+
+
+def fillQueries(index, sampler, needed, selectivity=0.0, _range=0, scale=1):
+	queries = np.empty((0, 2))
+	draws = 0
+	while len(queries) < needed:
+		if draws == MAX_DRAWS:
+			raise ValueError(f"Only {len(queries)} of {needed} queries (selectivity {selectivity}, range {_range}) were valid in {MAX_DRAWS} rounds")
+		draws += 1
+		queries = np.concatenate((queries, queryPairs(index, sampler(needed), selectivity=selectivity, _range=_range, scale=scale)))
+	return queries[:needed]
+
+
+def generateHotQueries(index, bins, hotRanges, hotFraction, selectivities=[], ranges=[], count=100, scale=1):
+	"""
+	Vectorized counterpart of generateQueries: hotFraction of left endpoints fall into hot regions, the rest are uniform.
+	"""
+	lefts, rights, weights = hotRegions(index, bins, hotRanges)
+	_min = np.min(index)
+	_max = np.max(index)
+
+	def produce(selectivity=0, _range=0):
+		def hotSampler(needed):
+			region = np.random.choice(len(weights), size=needed, p=weights)
+			return lefts[region] + np.random.rand(needed) * (rights[region] - lefts[region])
+
+		hot = int(round(count * hotFraction))
+		queries = np.concatenate((
+			fillQueries(index, hotSampler, hot, selectivity=selectivity, _range=_range, scale=scale),
+			fillQueries(index, lambda needed: np.random.uniform(_min, _max, size=needed), count - hot, selectivity=selectivity, _range=_range, scale=scale),
+		))
+		np.random.shuffle(queries)
+
+		return [(int(query[0]), query[1] if selectivity > 0.0 else int(query[1])) for query in queries], selectivity if selectivity > 0.0 else _range
+
+	for selectivity in selectivities:
+		yield produce(selectivity=float(selectivity))
+
+	for _range in ranges:
+		yield produce(_range=int(_range))
+
+
+BURST_ON = 1.0
+BURST_OFF = 4.0
+DIURNAL_PERIOD = 24 * 60 * 60
+DIURNAL_AMPLITUDE = 0.9
+
+
+def generateArrivals(count, arrival, rate):
+	"""
+	Returns count increasing timestamps (in seconds) with mean rate queries per second.
+	"""
+	if arrival == Arrival.POISSON:
+		return np.cumsum(np.random.exponential(1 / rate, size=count))
+
+	elif arrival == Arrival.BURSTY:
+		# Poisson arrivals over "on" time only, then every arrival is pushed right by the "off" gaps preceding its burst
+		onTimes = np.cumsum(np.random.exponential(BURST_ON / (rate * (BURST_ON + BURST_OFF)), size=count))
+
+		bursts = max(1, int(2 * onTimes[-1] / BURST_ON))
+		onEnds = np.cumsum(np.random.exponential(BURST_ON, size=bursts))
+		while onEnds[-1] < onTimes[-1]:
+			onEnds = np.concatenate((onEnds, onEnds[-1] + np.cumsum(np.random.exponential(BURST_ON, size=bursts))))
+
+		offBefore = np.concatenate(([0.0], np.cumsum(np.random.exponential(BURST_OFF, size=len(onEnds)))))
+
+		return onTimes + offBefore[np.searchsorted(onEnds, onTimes, side="right")]
+
+	elif arrival == Arrival.DIURNAL:
+		# thinning of a homogeneous process at the peak rate
+		peak = rate * (1 + DIURNAL_AMPLITUDE)
+		timestamps = np.empty(0)
+		last = 0.0
+		while len(timestamps) < count:
+			candidates = last + np.cumsum(np.random.exponential(1 / peak, size=count))
+			last = candidates[-1]
+			accept = np.random.rand(count) * peak < rate * (1 + DIURNAL_AMPLITUDE * np.sin(2 * np.pi * candidates / DIURNAL_PERIOD))
+			timestamps = np.concatenate((timestamps, candidates[accept]))
+
+		return timestamps[:count]
+
+
+def applyLocality(queries, locality, window, shift):
+	"""
+	With probability locality, query i repeats query i - lag (lag uniform in [1, window]), shifted by up to shift of its width.
+	Chains of reuses are resolved to their fresh origin by pointer jumping.
+	"""
+	count = len(queries)
+	positions = np.arange(count)
+	reuse = np.random.rand(count) < locality
+	reuse[0] = False
+
+	sources = np.where(reuse, np.maximum(positions - np.random.randint(1, window + 1, size=count), 0), positions)
+	while True:
+		jumped = sources[sources]
+		if np.array_equal(jumped, sources):
+			break
+		sources = jumped
+
+	result = queries[sources]
+	if shift > 0.0:
+		delta = np.where(reuse, np.random.uniform(-shift, shift, size=count) * (result[:, 1] - result[:, 0]), 0.0)
+		result[:, 0] += delta
+		result[:, 1] += delta
+
+	return result
+
+
+def generateTraces(index, bins, count, arrival, rate, locality, window, shift, selectivities=[], ranges=[]):
+	"""
+	Yields (n, 3) arrays of (timestamp, left, right); fresh queries follow the data distribution.
+	"""
+	hist, edges = np.histogram(index, bins=bins)
+	cdf = np.cumsum(hist) / len(index)
+
+	def followSampler(needed):
+		leftBins = np.minimum(np.searchsorted(cdf, np.random.rand(needed), side="right"), len(hist) - 1)
+		return edges[leftBins] + np.random.rand(needed) * (edges[leftBins + 1] - edges[leftBins])
+
+	def produce(selectivity=0, _range=0):
+		queries = fillQueries(index, followSampler, count, selectivity=selectivity, _range=_range)
+		queries = applyLocality(queries, locality, window, shift)
+
+		return np.column_stack((generateArrivals(count, arrival, rate), queries)), selectivity if selectivity > 0.0 else _range
+
+	for selectivity in selectivities:
+		yield produce(selectivity=float(selectivity))
+
+	for _range in ranges:
+		yield produce(_range=int(_range))
+
+
+JOINT_GRID_CELLS = 2**20
+
+
+def generateCorrelated(index, attributes, correlation):
+	"""
+	Gaussian copula with equal pairwise correlation; every attribute has the (sorted) index as its marginal.
+	Returns an (n, attributes) array.
+	"""
+	from scipy.special import ndtr
+
+	covariance = np.full((attributes, attributes), correlation)
+	np.fill_diagonal(covariance, 1.0)
+
+	uniforms = np.random.multivariate_normal(np.zeros(attributes), covariance, size=len(index))
+	ndtr(uniforms, out=uniforms)
+	uniforms *= len(index)
+
+	ranks = uniforms.astype(np.int64)
+	np.clip(ranks, 0, len(index) - 1, out=ranks)
+
+	return index[ranks]
+
+
+def boxCounts(prefix, lows, highs):
+	"""
+	Number of records in grid boxes [lows, highs) from an N-dimensional prefix count array, by inclusion-exclusion over 2^N corners.
+	"""
+	attributes = lows.shape[1]
+	counts = np.zeros(len(lows), dtype=np.int64)
+	for corner in range(2**attributes):
+		upper = [(corner >> axis) & 1 for axis in range(attributes)]
+		point = tuple(highs[:, axis] if upper[axis] else lows[:, axis] for axis in range(attributes))
+		counts += (-1)**(attributes - sum(upper)) * prefix[point]
+
+	return counts
+
+
+def generateJointQueries(data, selectivities=[], count=100):
+	"""
+	Conjunctive range queries over all attributes whose joint selectivity is closest from above to the target.
+	Boxes are grown around data points in a quantile grid and counted from multi-dimensional prefix sums, no rejection sampling.
+	"""
+	size, attributes = data.shape
+	grid = max(2, int(JOINT_GRID_CELLS**(1 / attributes)))
+
+	edges = [np.quantile(data[:, axis], np.linspace(0, 1, grid + 1)) for axis in range(attributes)]
+	cells = np.column_stack([np.clip(np.searchsorted(edges[axis], data[:, axis], side="right") - 1, 0, grid - 1) for axis in range(attributes)])
+
+	prefix = np.bincount(np.ravel_multi_index(cells.T, (grid, ) * attributes), minlength=grid**attributes).reshape((grid, ) * attributes)
+	for axis in range(attributes):
+		prefix = np.cumsum(prefix, axis=axis)
+	prefix = np.pad(prefix, [(1, 0)] * attributes)
+
+	def produce(selectivity):
+		target = size * selectivity / 100
+		centers = cells[np.random.randint(0, size, size=count)]
+
+		sides = np.full(count, grid)
+		lows = np.zeros((count, attributes), dtype=np.int64)
+		achieved = np.full(count, size)
+		for side in range(grid, 0, -1):
+			candidateLows = np.clip(centers - side // 2, 0, grid - side)
+			counts = boxCounts(prefix, candidateLows, candidateLows + side)
+			enough = counts >= target
+			sides[enough] = side
+			lows[enough] = candidateLows[enough]
+			achieved[enough] = counts[enough]
+
+		highs = lows + sides[:, None]
+		logging.debug(f"Joint selectivity {selectivity}%: achieved {100 * achieved.mean() / size:.3f}% on average")
+
+		queries = np.empty((count, 2 * attributes))
+		for axis in range(attributes):
+			queries[:, 2 * axis] = edges[axis][lows[:, axis]]
+			queries[:, 2 * axis + 1] = edges[axis][highs[:, axis]]
+
+		return queries, selectivity
+
+	for selectivity in selectivities:
+		yield produce(float(selectivity))
+
+
 def getRightEndpoint(index, left, selectivity=0.0, _range=0):
 	if selectivity > 0.0:
 		leftIndex = np.searchsorted(index, left)
@@ -144,7 +615,7 @@ def getRightEndpoint(index, left, selectivity=0.0, _range=0):
 	return right
 
 
-def generateQueries(index, bins, follow, selectivities=[], ranges=[]):
+def generateQueries(index, bins, follow, selectivities=[], ranges=[], scale=1):
 	if follow:
 		hist, bins = np.histogram(index, density=True, bins=bins)
 		cdf = np.cumsum(hist)
@@ -163,6 +634,8 @@ def generateQueries(index, bins, follow, selectivities=[], ranges=[]):
 				left = int((bins[leftBin + 1] - bins[leftBin]) * np.random.rand() + bins[leftBin])
 			else:
 				left = np.random.randint(int(_min), int(_max))
+			# whole dollars in cents mode too, as the endpoints are written without cents
+			left = left // scale * scale
 
 			try:
 				right = getRightEndpoint(index, left, selectivity=selectivity, _range=_range)
@@ -183,67 +656,155 @@ def generateQueries(index, bins, follow, selectivities=[], ranges=[]):
 		yield produce(_range=int(_range))
 
 
-def datasetName(dataset, size, pums, _max):
+def datasetName(dataset, size, pums, _max, skew=None, components=None, hotRanges=[]):
 	if dataset == Dataset.PUMS:
 		return f"{dataset}-{pums}"
 	elif dataset == Dataset.CA:
 		return f"{dataset}-{size}"
 	elif dataset == Dataset.UNIFORM:
 		return f"{dataset}-{size}-{_max}"
+	elif dataset in [Dataset.ZIPF, Dataset.LOGNORMAL]:
+		return f"{dataset}-{size}-{_max}-{skew}"
+	elif dataset == Dataset.MIXTURE:
+		return f"{dataset}-{size}-{_max}-{components}"
+	elif dataset == Dataset.HOTRANGE:
+		return f"{dataset}-{size}-{_max}-{len(hotRanges)}"
 
 
 def main():
 
-	size, bins, dataset, pums, _min, _max, crop, hist, selectivities, ranges = parse()
+	size, bins, dataset, pums, _min, _max, skew, components, hotRanges, hotFraction, traceSize, arrivals, rate, locality, localityWindow, localityShift, attributes, correlation, sidecarBuckets, crop, hist, cents, selectivities, ranges = parse()
+	name = datasetName(dataset, size, pums, _max, skew=skew, components=components, hotRanges=hotRanges)
 
-	if dataset == Dataset.CA:
-		logging.debug("Reading CA employees dataset")
+	with stage("load"):
+		if dataset == Dataset.CA:
+			logging.debug("Reading CA employees dataset")
 
-		index = pd.read_csv("../../datasets/state-of-california-2019.csv", usecols=["Total Pay & Benefits"], squeeze=True)
-	elif dataset == Dataset.UNIFORM:
-		logging.debug("Generating uniform dataset")
+			index = pd.read_csv("../../datasets/state-of-california-2019.csv", usecols=["Total Pay & Benefits"], squeeze=True).to_numpy(dtype=np.float64)
+		elif dataset == Dataset.UNIFORM:
+			logging.debug("Generating uniform dataset")
 
-		index = generateUniform(size, _min, _max)
-	elif dataset == Dataset.PUMS:
-		logging.debug(f"Reading PUMS ({pums}) dataset")
+			index = generateUniform(size, _min, _max)
+		elif dataset == Dataset.ZIPF:
+			logging.debug(f"Generating Zipf ({skew}) dataset")
 
-		if pums == "us":
-			index = pd.concat((pd.read_csv(f"../../datasets/pums-{pums}-{i}.csv", usecols=["WAGP"], squeeze=True)) for i in range(1, 5))
-		else:
-			index = pd.read_csv(f"../../datasets/pums-{pums}.csv", usecols=["WAGP"], squeeze=True)
+			index = generateZipf(size, _min, _max, skew)
+		elif dataset == Dataset.LOGNORMAL:
+			logging.debug(f"Generating lognormal ({skew}) dataset")
+
+			index = generateLognormal(size, _min, _max, skew)
+		elif dataset == Dataset.MIXTURE:
+			logging.debug(f"Generating mixture ({components} components) dataset")
+
+			index = generateMixture(size, _min, _max, components)
+		elif dataset == Dataset.HOTRANGE:
+			logging.debug(f"Generating hot-range ({len(hotRanges)} ranges) dataset")
+
+			index = generateHotRanges(size, _min, _max, hotRanges)
+		elif dataset == Dataset.PUMS:
+			logging.debug(f"Reading PUMS ({pums}) dataset")
+
+			if pums == "us":
+				index = pd.concat((pd.read_csv(f"../../datasets/pums-{pums}-{i}.csv", usecols=["WAGP"], squeeze=True)) for i in range(1, 5)).to_numpy(dtype=np.float64)
+			else:
+				index = pd.read_csv(f"../../datasets/pums-{pums}.csv", usecols=["WAGP"], squeeze=True).to_numpy(dtype=np.float64)
+
+	with stage("crop"):
+		# NaNs sort to the end, so dropping them and cropping are both views over the sorted buffer
+		index.sort()
+		index = index[:np.searchsorted(index, np.nan)]
 
-		index = index[~np.isnan(index)]
+		if crop:
+			logging.debug(f"Cropping [{_min}, {_max}]")
+			index = index[np.searchsorted(index, _min, side="left"):np.searchsorted(index, _max, side="right")]
 
-	if crop:
-		logging.debug(f"Cropping [{_min}, {_max}]")
-		index = index[(index >= _min) & (index <= _max)]
+	with stage("resize"):
+		index = changeSize(index, size, bins=bins)
 
-	index = changeSize(index, size, bins=bins)
-	index = index + np.random.rand(len(index))
-	index = np.around(index, decimals=2)
-	index = np.sort(index)
+	with stage("noise"):
+		index = addNoise(index)
+
+	with stage("round"):
+		if cents:
+			index = toCents(index)
+		else:
+			np.around(index, decimals=2, out=index)
+
+	with stage("sort"):
+		index.sort()
+
+	scale = 100 if cents else 1
 
 	logging.debug(f"\n{index}")
 	logging.debug(f"Size: {len(index)}")
 
 	if hist:
-		histogram(index, bins, f"histogram-{dataset}{f'-{pums}' if dataset == Dataset.PUMS else ''}", crop)
+		histogram(index / scale, bins, f"histogram-{dataset}{f'-{pums}' if dataset == Dataset.PUMS else ''}", crop)
 
 	logging.debug("Writing Results")
 
-	with open(f"../output/dataset-{datasetName(dataset, size, pums, _max)}.csv", "w") as out:
-		for record in index:
-			out.write(f"{record}\n")
+	with stage("write"):
+		writeIndex(index, f"../output/dataset-{name}.csv", scale)
 
-	for followDistribution in [True, False]:
-		for queries, selectivity in generateQueries(index, bins, followDistribution, selectivities=selectivities):
-			with open(f"../output/queries-{datasetName(dataset, size, pums, _max)}-{selectivity}-{'follow' if followDistribution else 'uniform'}.csv", "w") as out:
-				for query in queries:
-					out.write(f"{query[0]},{query[1]}\n")
-		for queries, _range in generateQueries(index, bins, followDistribution, ranges=ranges):
-			with open(f"../output/queries-{datasetName(dataset, size, pums, _max)}-{_range}-{'follow' if followDistribution else 'uniform'}.csv", "w") as out:
-				for query in queries:
+	answers = {}
+
+	def writeQueries(queries, parameter, distribution, ranged):
+		answers[f"queries-{name}-{parameter}-{distribution}"] = answerSizes(index, queries)
+		with open(f"../output/queries-{name}-{parameter}-{distribution}.csv", "w") as out:
+			for query in queries:
+				if scale == 1:
 					out.write(f"{query[0]},{query[1]}\n")
+				else:
+					# left endpoints (and right ones of range queries) are whole dollars; selectivity queries end at a record value
+					out.write(f"{int(query[0]) // scale},{int(query[1]) // scale if ranged else int(query[1]) / scale}\n")
+
+	with stage("queries"):
+		for followDistribution in [True, False]:
+			for queries, selectivity in generateQueries(index, bins, followDistribution, selectivities=selectivities, scale=scale):
+				writeQueries(queries, selectivity, 'follow' if followDistribution else 'uniform', False)
+			for queries, _range in generateQueries(index, bins, followDistribution, ranges=[int(_range) * scale for _range in ranges], scale=scale):
+				writeQueries(queries, _range // scale, 'follow' if followDistribution else 'uniform', True)
+
+		if hotFraction > 0.0:
+			scaledHotRanges = [(left * scale, right * scale, weight) for left, right, weight in hotRanges]
+			for left, right, _ in scaledHotRanges:
+				if right <= index[0] or left >= index[-1]:
+					raise ValueError(f"Hot range {left / scale}:{right / scale} lies outside the data, [{index[0] / scale}, {index[-1] / scale}]")
+			for queries, selectivity in generateHotQueries(index, bins, scaledHotRanges, hotFraction, selectivities=selectivities, scale=scale):
+				writeQueries(queries, selectivity, f"hot-{hotFraction}", False)
+			for queries, _range in generateHotQueries(index, bins, scaledHotRanges, hotFraction, ranges=[int(_range) * scale for _range in ranges], scale=scale):
+				writeQueries(queries, _range // scale, f"hot-{hotFraction}", True)
+
+	if sidecarBuckets > 0:
+		with stage("sidecar"):
+			writeSidecar(f"../output/dataset-{name}.csv", index, sidecarBuckets, scale=scale, answers=answers)
+
+	def writeTrace(trace, parameter, arrival):
+		with open(f"../output/trace-{name}-{parameter}-{str(arrival).lower()}-{locality}.csv", "w") as out:
+			for start in range(0, len(trace), WRITE_CHUNK):
+				out.write("".join(f"{event[0]:.6f},{event[1] / scale:.2f},{event[2] / scale:.2f}\n" for event in trace[start:start + WRITE_CHUNK].tolist()))
+
+	if traceSize > 0:
+		with stage("traces"):
+			for arrival in arrivals:
+				for trace, selectivity in generateTraces(index, bins, traceSize, arrival, rate, locality, localityWindow, localityShift, selectivities=selectivities):
+					writeTrace(trace, selectivity, arrival)
+				for trace, _range in generateTraces(index, bins, traceSize, arrival, rate, locality, localityWindow, localityShift, ranges=[int(_range) * scale for _range in ranges]):
+					writeTrace(trace, _range // scale, arrival)
+
+	if attributes > 1:
+		with stage("joint"):
+			jointName = f"{name}-{attributes}d-{correlation}"
+			data = generateCorrelated(index, attributes, correlation)
+
+			with open(f"../output/dataset-{jointName}.csv", "w") as out:
+				for start in range(0, len(data), WRITE_CHUNK):
+					out.write("".join(",".join(f"{value / scale}" for value in row) + "\n" for row in data[start:start + WRITE_CHUNK].tolist()))
+
+			for queries, selectivity in generateJointQueries(data, selectivities=selectivities):
+				with open(f"../output/queries-{jointName}-{selectivity}-joint.csv", "w") as out:
+					for query in queries.tolist():
+						out.write(",".join(f"{value / scale:.2f}" for value in query) + "\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""
+Closed-form model of the records per ORAM a query fetches (real + padding + noise = total), vectorized over parameter grids.
+
+A query of the given selectivity over N records returns R = selectivity * N real records and touches two partial
+buckets of N / B records each (padding). The DP mechanism adds D = c * h / epsilon * ln(1 / beta) noise records, where h is the
+height of the bucket tree (log2 B) capped by levels. With the gamma method, records are spread over m ORAMs and each ORAM
+fetches k = mu + sqrt(a * mu * ln(m / beta)) with mu = (R + padding + D) / m, so that no ORAM overflows with probability
+beta; without it, every ORAM answers with the noise of the whole tree. c and a are calibrated on bin/main results (fit()).
+"""
+
+import logging
+import numpy as np
+
+# fitted on the PUMS-california epsilon sweep of plot-epsilons.py (64 ORAMs, 65536 buckets, beta 2^-20, gamma)
+C = 4.85
+A = 2.41
+
+
+def parse():
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Predict DP-ORAM records per ORAM over a parameter grid")
+
+	parser.add_argument("--orams", dest="orams", metavar="orams", type=int, nargs='+', default=[64], help=f"ORAM counts.")
+	parser.add_argument("--buckets", dest="buckets", metavar="buckets", type=int, nargs='+', default=[65536], help=f"Bucket counts.")
+	parser.add_argument("--beta", dest="beta", metavar="beta", type=float, nargs='+', default=[20], help=f"Beta exponents (beta = 2^-value).")
+	parser.add_argument("--epsilon", dest="epsilon", metavar="epsilon", type=float, nargs='+', default=[0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.6, 0.693, 0.7, 0.8, 0.9, 1.0], help=f"Epsilons.")
+	parser.add_argument("--gamma", dest="gamma", metavar="gamma", type=lambda value: value.lower() == "true", nargs='+', default=[True], help=f"Whether the gamma method is used.")
+	parser.add_argument("--levels", dest="levels", metavar="levels", type=int, nargs='+', default=[256], help=f"Pruning levels (the noisy tree height cap).")
+	parser.add_argument("--records", dest="records", metavar="records", type=int, default=1000000, help=f"The number of records in the dataset.")
+	parser.add_argument("--selectivity", dest="selectivity", metavar="selectivity", type=float, default=0.005, help=f"The fraction of records a query returns.")
+	parser.add_argument("--fit", dest="fit", metavar="cache", type=str, default=None, help=f"Calibrate c and a on the results in this sweep cache directory before predicting.")
+
+	parser.add_argument("-v", "--verbose", dest="verbose", default=False, help="increase output verbosity", action="store_true")
+
+	args = parser.parse_args()
+
+	logging.basicConfig(
+		level=logging.DEBUG if args.verbose else logging.INFO,
+		format='%(asctime)s %(levelname)-8s %(message)s',
+		datefmt='%a, %d %b %Y %H:%M:%S',
+	)
+
+	axes = dict(orams=args.orams, buckets=args.buckets, beta=args.beta, epsilon=args.epsilon, gamma=args.gamma, levels=args.levels)
+
+	return axes, args.records, args.selectivity, args.fit
+
+
+def grid(**axes):
+	"""
+	Cartesian product of the axes as a dict of equally shaped flat arrays.
+	"""
+	mesh = np.meshgrid(*[np.asarray(values) for values in axes.values()], indexing="ij")
+	return {name: values.ravel() for name, values in zip(axes, mesh)}
+
+
+def predict(orams, buckets, beta, epsilon, gamma=True, levels=256, records=1000000, selectivity=0.005, c=C, a=A):
+	"""
+	Records per ORAM for broadcastable parameter arrays (beta is the exponent of 2^-beta).
+	Returns a dict of float arrays real, padding, noise and total.
+	"""
+	orams = np.asarray(orams, dtype=np.float64)
+	buckets = np.asarray(buckets, dtype=np.float64)
+	epsilon = np.asarray(epsilon, dtype=np.float64)
+	logBeta = np.asarray(beta, dtype=np.float64) * np.log(2)
+	height = np.minimum(np.log2(buckets), np.maximum(np.asarray(levels, dtype=np.float64), 1))
+
+	real = selectivity * np.asarray(records, dtype=np.float64)
+	padding = 2 * np.asarray(records, dtype=np.float64) / buckets
+	noise = c * height / epsilon * logBeta
+
+	mean = (real + padding + noise) / orams
+	withGamma = mean + np.sqrt(a * mean * (np.log(orams) + logBeta))
+	total = np.where(gamma, withGamma, (real + padding) / orams + noise)
+
+	result = {"real": real / orams, "padding": padding / orams}
+	result = {name: np.broadcast_to(values, total.shape) for name, values in result.items()}
+	result["noise"] = total - result["real"] - result["padding"]
+	result["total"] = total
+
+	return result
+
+
+def fit(parameters, totals, records=1000000, selectivity=0.005):
+	"""
+	Least-squares calibration of c and a on observed totals per ORAM; parameters is a dict of predict() arrays. Returns (c, a).
+	"""
+	from scipy.optimize import least_squares
+
+	totals = np.asarray(totals, dtype=np.float64)
+
+	def residuals(x):
+		return (predict(**parameters, records=records, selectivity=selectivity, c=x[0], a=x[1])["total"] - totals) / totals
+
+	solution = least_squares(residuals, x0=[C, A], bounds=([1e-6, 0], [np.inf, np.inf]))
+	return tuple(float(value) for value in solution.x)
+
+
+def cachedResults(directory):
+	"""
+	Parameters and totals per ORAM of the successful runs in a sweep result cache.
+	"""
+	from sweep import ResultCache
+
+	columns = {name: [] for name in ["orams", "buckets", "beta", "epsilon", "gamma", "levels"]}
+	totals = []
+	for _, entry in ResultCache(directory, None).entries():
+		parameters = entry["parameters"]
+		if entry.get("records") is None or parameters.get("virtualRequests") is False:
+			continue
+		for name, key in zip(columns, ["oramsNumber", "bucketsNumber", "beta", "epsilon", "useGamma", "levels"]):
+			columns[name] += [parameters[key]]
+		totals += [entry["records"]["total"] / parameters["oramsNumber"]]
+
+	return {name: np.array(values) for name, values in columns.items()}, np.array(totals)
+
+
+def main():
+
+	axes, records, selectivity, cache = parse()
+
+	c, a = C, A
+	if cache is not None:
+		parameters, totals = cachedResults(cache)
+		if len(totals) >= 2:
+			c, a = fit(parameters, totals, records, selectivity)
+			logging.info(f"Calibrated on {len(totals)} cached runs: c = {c:.3f}, a = {a:.3f}")
+		else:
+			logging.warning(f"Not enough cached runs in {cache} to calibrate; using c = {c}, a = {a}")
+
+	points = grid(**axes)
+	prediction = predict(**points, records=records, selectivity=selectivity, c=c, a=a)
+
+	print(f"{'ORAMs':<10}{'Buckets':<10}{'beta':<10}{'epsilon':<10}{'gamma':<10}{'levels':<10}Predicted per ORAM (real+padding+noise=total)")
+	for i in range(len(prediction["total"])):
+		beta = f"2^{{-{points['beta'][i]:g}}}"
+		print(f"{points['orams'][i]:<10}{points['buckets'][i]:<10}{beta:<10}{points['epsilon'][i]:<10g}{str(points['gamma'][i]):<10}{points['levels'][i]:<10}{prediction['real'][i]:.0f} + {prediction['padding'][i]:.0f} + {prediction['noise'][i]:.0f} = {prediction['total'][i]:.0f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Monte Carlo simulation of how a dataset and queryset spread over ORAMs.
+
+Records are assigned to ORAMs uniformly at random (as bin/main partitions them), a query is widened to the
+boundaries of the equal-depth buckets it touches (the extra records are padding), and the per-ORAM hits of
+every query are counted with one bincount per trial. Trials run on a process pool.
+"""
+
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from model import A
+
+# set in every worker by initialize() so the arrays are not pickled per trial
+_ranges = None
+_records = None
+
+
+def parse():
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Simulate per-ORAM load of a queryset over random partitions")
+
+	parser.add_argument("--dataset", dest="dataset", metavar="dataset", type=str, required=True, help=f"Dataset file (the first column is the indexed value).")
+	parser.add_argument("--queryset", dest="queryset", metavar="queryset", type=str, required=True, help=f"Queryset file of left,right lines.")
+	parser.add_argument("--orams", dest="orams", metavar="orams", type=int, nargs='+', default=[64], help=f"ORAM counts to simulate.")
+	parser.add_argument("--buckets", dest="buckets", metavar="buckets", type=int, default=65536, help=f"The number of equal-depth buckets queries are widened to.")
+	parser.add_argument("--beta", dest="beta", metavar="beta", type=int, default=20, help=f"Beta exponent of the gamma bound overflow check (beta = 2^-value).")
+	parser.add_argument("--trials", dest="trials", metavar="trials", type=int, default=100, help=f"The number of random partitions.")
+	parser.add_argument("--processes", dest="processes", metavar="processes", type=int, default=None, help=f"Worker processes (all cores by default).")
+
+	parser.add_argument("--seed", dest="seed", metavar="seed", type=int, default=1305, required=False, help="Seed to use for PRG")
+	parser.add_argument("-v", "--verbose", dest="verbose", default=False, help="increase output verbosity", action="store_true")
+
+	args = parser.parse_args()
+
+	logging.basicConfig(
+		level=logging.DEBUG if args.verbose else logging.INFO,
+		format='%(asctime)s %(levelname)-8s %(message)s',
+		datefmt='%a, %d %b %Y %H:%M:%S',
+	)
+
+	return args.dataset, args.queryset, args.orams, args.buckets, args.beta, args.trials, args.processes, args.seed
+
+
+def loadColumn(path, columns):
+	import pandas as pd
+
+	return pd.read_csv(path, header=None, usecols=list(range(columns)), dtype=np.float64).values
+
+
+def queryRanges(values, queries, buckets):
+	"""
+	Positions [start, end) in the sorted values of each query's records and of its bucket-widened range.
+	"""
+	starts = np.searchsorted(values, queries[:, 0], side="left")
+	ends = np.searchsorted(values, queries[:, 1], side="right")
+
+	# equal-depth buckets: boundaries every len / buckets sorted positions
+	depth = max(1, len(values) // buckets)
+	paddedStarts = starts // depth * depth
+	paddedEnds = np.minimum(-(-ends // depth) * depth, len(values))
+
+	return np.stack([starts, ends, paddedStarts, paddedEnds], axis=1)
+
+
+def segments(ranges):
+	"""
+	Concatenated positions of all [start, end) ranges and the index of the range each position belongs to.
+	"""
+	lengths = ranges[:, 1] - ranges[:, 0]
+	owners = np.repeat(np.arange(len(ranges)), lengths)
+	offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+	return ranges[owners, 0] + offsets, owners
+
+
+def initialize(ranges, records):
+	global _ranges, _records
+	_ranges = ranges
+	_records = records
+
+
+def trial(orams, seed):
+	"""
+	Per-query, per-ORAM real and padded hits for one random partition, as two (queries, orams) arrays.
+	"""
+	assignment = np.random.default_rng(seed).integers(orams, size=_records, dtype=np.int32)
+
+	hits = []
+	for columns in [[0, 1], [2, 3]]:
+		positions, owners = segments(_ranges[:, columns])
+		hits += [np.bincount(owners * orams + assignment[positions], minlength=len(_ranges) * orams).reshape(len(_ranges), orams)]
+
+	return hits
+
+
+def gammaBound(mean, orams, beta):
+	return mean + np.sqrt(A * mean * (np.log(orams) + beta * np.log(2)))
+
+
+def confidence(values):
+	"""
+	Mean and the half-width of its 95% confidence interval.
+	"""
+	return float(np.mean(values)), float(1.96 * np.std(values, ddof=1) / np.sqrt(len(values))) if len(values) > 1 else 0.0
+
+
+def main():
+
+	dataset, queryset, oramsList, buckets, beta, trials, processes, seed = parse()
+
+	values = np.sort(loadColumn(dataset, 1)[:, 0])
+	queries = loadColumn(queryset, 2)
+	ranges = queryRanges(values, queries, buckets)
+	logging.info(f"Loaded {len(values)} records and {len(queries)} queries ({np.mean(ranges[:, 1] - ranges[:, 0]):.0f} real, {np.mean(ranges[:, 3] - ranges[:, 2]):.0f} padded records per query on average)")
+
+	print(f"{'ORAMs':<8}{'real':>10}{'padded':>10}{'max real':>18}{'max padded':>18}{'p99 max':>10}{'worst':>8}{'over bound':>12}")
+	with ProcessPoolExecutor(max_workers=processes, initializer=initialize, initargs=(ranges, len(values))) as pool:
+		for orams in oramsList:
+			seeds = np.random.SeedSequence([seed, orams]).generate_state(trials)
+			realMax = []
+			paddedMax = []
+			overflows = 0
+			for real, padded in pool.map(trial, [orams] * trials, seeds, chunksize=max(1, trials // (4 * (processes or 1)))):
+				realMax += [real.max(axis=1)]
+				paddedMax += [padded.max(axis=1)]
+				overflows += np.sum(padded.max(axis=1) > gammaBound(padded.sum(axis=1) / orams, orams, beta))
+
+			realMax = np.array(realMax)
+			paddedMax = np.array(paddedMax)
+			realMean, realError = confidence(realMax.mean(axis=1))
+			paddedMean, paddedError = confidence(paddedMax.mean(axis=1))
+
+			print(f"{orams:<8}{np.mean(ranges[:, 1] - ranges[:, 0]) / orams:>10.1f}{np.mean(ranges[:, 3] - ranges[:, 2]) / orams:>10.1f}{f'{realMean:.1f} ± {realError:.1f}':>18}{f'{paddedMean:.1f} ± {paddedError:.1f}':>18}{np.percentile(paddedMax, 99):>10.0f}{paddedMax.max():>8}{overflows / paddedMax.size:>12.2e}")
+
+
+if __name__ == "__main__":
+	main()
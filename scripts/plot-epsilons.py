@@ -1,18 +1,25 @@
 #!/usr/bin/env python3
 
-from bokeh.models import Legend
-from bokeh.plotting import figure, show
-from bokeh.io import export_svgs
+import re
+import logging
+import numpy as np
 
 lineSize = 2
 circleSize = 3
 
+# analyzer (dp-oram-analyzer.csx) and sweep.py result lines; the csx prefixes a "date |" and sweep.py adds a time column
+RESULT_LINE = re.compile(r"^(?:[^|]*\|)?\s*(\d+)\s+(\d+)\s+2\^\{-(\d+)\}\s+([0-9]+\.?[0-9]*)\s+(True|False)\s+(\S+)\s+(?:[0-9]+\.[0-9]+\s+)?(\d+) \+ (\d+) \+ (\d+) = (\d+)")
+INPUT_LINE = re.compile(r"^Input: (\S+)")
 
-def plotEpsilons(epsilons, noises, totals):
 
-	print(epsilons)
-	print(noises)
-	print(totals)
+def plotEpsilons(sweeps, output, show):
+	"""
+	sweeps maps a label to typed arrays (epsilons, noises, totals); each sweep gets a noise line and a dashed total line of one color.
+	"""
+	from bokeh.models import Legend
+	from bokeh.plotting import figure
+	from bokeh.io import export_svgs, show as showPlot
+	from bokeh.palettes import Category10
 
 	plot = figure(title="Epsilons", x_axis_label="Epsilons", y_axis_label="Records")
 	plot.xaxis.axis_label_text_font = "normal"
@@ -20,22 +27,30 @@ def plotEpsilons(epsilons, noises, totals):
 	plot.xaxis.ticker.desired_num_ticks = 30
 	plot.title.align = "center"
 
-	rNoises = plot.line(epsilons, noises, line_width=lineSize)
-	rNoisesMarkers = plot.circle(epsilons, noises, size=circleSize)
+	items = []
+	palette = Category10[10]
+	for i, (label, (epsilons, noises, totals)) in enumerate(sweeps.items()):
+		color = palette[i % len(palette)] if len(sweeps) > 1 else None
+		prefix = f"{label}: " if len(sweeps) > 1 else ""
 
-	rTotals = plot.line(epsilons, totals, line_width=lineSize, color="dodgerblue")
-	rTotalsMarkers = plot.circle(epsilons, totals, size=circleSize, color="dodgerblue")
+		rNoises = plot.line(epsilons, noises, line_width=lineSize, **({"color": color} if color else {}))
+		rNoisesMarkers = plot.circle(epsilons, noises, size=circleSize, **({"color": color} if color else {}))
 
-	plot.add_layout(Legend(items=[("Noises", [rNoises, rNoisesMarkers]), ("Totals", [rTotals, rTotalsMarkers])]))
+		rTotals = plot.line(epsilons, totals, line_width=lineSize, color=color or "dodgerblue", line_dash="dashed" if color else "solid")
+		rTotalsMarkers = plot.circle(epsilons, totals, size=circleSize, color=color or "dodgerblue")
 
-	show(plot)
+		items += [(f"{prefix}Noises", [rNoises, rNoisesMarkers]), (f"{prefix}Totals", [rTotals, rTotalsMarkers])]
+
+	plot.add_layout(Legend(items=items))
+
+	if show:
+		showPlot(plot)
 
 	plot.output_backend = "svg"
-	export_svgs(plot, filename=f"../output/plot-epsilons.svg")
+	export_svgs(plot, filename=output)
 
 
-def main():
-	input = """
+DEFAULT_INPUT = """
 Seed: 1305
 Count: 0
 Input: PUMS-california
@@ -56,27 +71,117 @@ Input: PUMS-california
 07/12/2020 14:27:45 |  64        65536     2^{-20}   0.9       True      False     78 + 1 + 83 = 162
 07/12/2020 14:27:45 |  64        65536     2^{-20}   1         True      False     78 + 1 + 80 = 160
 """
-	# 07/12/2020 14:27:45 |  64        65536     2^{-20}   1.1       True      False     78 + 1 + 78 = 158
-	# 07/12/2020 14:27:45 |  64        65536     2^{-20}   1.3       True      False     78 + 1 + 75 = 155
-	# 07/12/2020 14:27:45 |  64        65536     2^{-20}   1.5       True      False     78 + 1 + 73 = 152
-	# 07/12/2020 14:27:45 |  64        65536     2^{-20}   2         True      False     78 + 1 + 69 = 149
-	# 07/12/2020 14:27:45 |  64        65536     2^{-20}   5         True      False     78 + 1 + 62 = 142
-	# 07/12/2020 14:27:45 |  64        65536     2^{-20}   7.5       True      False     78 + 1 + 61 = 140
-	# 07/12/2020 14:27:45 |  64        65536     2^{-20}   10        True      False     78 + 1 + 60 = 139
-
-	import re
-
-	processor = re.compile("\}\s+([0-9]+\.?[0-9]*).*\+ (\d+) \= (\d+)", re.MULTILINE)
-
-	epsilons = []
-	noises = []
-	totals = []
-	for match in processor.finditer(input):
-		epsilons += [match.group(1)]
-		noises += [match.group(2)]
-		totals += [match.group(3)]
-
-	plotEpsilons(epsilons, noises, totals)
+# 07/12/2020 14:27:45 |  64        65536     2^{-20}   1.1       True      False     78 + 1 + 78 = 158
+# 07/12/2020 14:27:45 |  64        65536     2^{-20}   1.3       True      False     78 + 1 + 75 = 155
+# 07/12/2020 14:27:45 |  64        65536     2^{-20}   1.5       True      False     78 + 1 + 73 = 152
+# 07/12/2020 14:27:45 |  64        65536     2^{-20}   2         True      False     78 + 1 + 69 = 149
+# 07/12/2020 14:27:45 |  64        65536     2^{-20}   5         True      False     78 + 1 + 62 = 142
+# 07/12/2020 14:27:45 |  64        65536     2^{-20}   7.5       True      False     78 + 1 + 61 = 140
+# 07/12/2020 14:27:45 |  64        65536     2^{-20}   10        True      False     78 + 1 + 60 = 139
+
+
+def parse():
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Plot noise and total records per ORAM against epsilon")
+
+	parser.add_argument("--logs", dest="logs", metavar="logs", type=str, nargs='+', default=[], help=f"Analyzer or sweep.py output files; every configuration in them becomes a curve.")
+	parser.add_argument("--cache", dest="cache", metavar="cache", type=str, nargs='+', default=[], help=f"sweep.py result cache directories to plot.")
+	parser.add_argument("--store", dest="store", metavar="store", type=str, default=None, help=f"SQLite results store to plot the successful runs of.")
+	parser.add_argument("--output", dest="output", metavar="output", type=str, default="../output/plot-epsilons.svg", help=f"The SVG to write.")
+	parser.add_argument("--no-show", dest="show", default=True, help="Do not open the plot in a browser", action="store_false")
+
+	parser.add_argument("-v", "--verbose", dest="verbose", default=False, help="increase output verbosity", action="store_true")
+
+	args = parser.parse_args()
+
+	logging.basicConfig(
+		level=logging.DEBUG if args.verbose else logging.INFO,
+		format='%(asctime)s %(levelname)-8s %(message)s',
+		datefmt='%a, %d %b %Y %H:%M:%S',
+	)
+
+	return args.logs, args.cache, args.store, args.output, args.show
+
+
+def readSweeps(lines, sweeps, source=""):
+	"""
+	Adds the result lines to sweeps, a dict of sweep label to lists of (epsilon, noise, total), in one pass.
+	"""
+	for line in lines:
+		match = RESULT_LINE.match(line)
+		if match is None:
+			inputMatch = INPUT_LINE.match(line)
+			if inputMatch:
+				source = inputMatch.group(1)
+			continue
+
+		orams, buckets, beta, epsilon, gamma, prune, real, padding, noise, total = match.groups()
+		label = f"{source + ' ' if source else ''}{orams} ORAMs, {buckets} buckets, 2^-{beta}{'' if gamma == 'True' else ', no gamma'}{'' if prune in ['False', '256'] else ', pruned'}"
+		sweeps.setdefault(label, []).append((float(epsilon), int(noise), int(total)))
+
+	return sweeps
+
+
+def readCache(directory, sweeps):
+	from sweep import ResultCache
+
+	for _, entry in ResultCache(directory, None).entries():
+		parameters = entry["parameters"]
+		records = entry.get("records")
+		if records is None:
+			continue
+		n = int(parameters["oramsNumber"])
+		label = f"{parameters['dataset'].replace('dataset-', '')} {n} ORAMs, {parameters['bucketsNumber']} buckets, 2^-{parameters['beta']}{'' if parameters['useGamma'] else ', no gamma'}{'' if int(parameters['levels']) == 256 else ', pruned'}"
+		sweeps.setdefault(label, []).append((float(parameters["epsilon"]), records["noise"] // n, records["total"] // n))
+
+	return sweeps
+
+
+def readStore(path, sweeps):
+	from results import ResultStore
+
+	store = ResultStore(path)
+	runs = store.runs(columns=["dataset", "oramsNumber", "bucketsNumber", "beta", "useGamma", "levels", "epsilon"])
+	store.close()
+
+	runs = runs[runs["total"].notna() & runs["epsilon"].notna()]
+	for (dataset, n, buckets, beta, gamma, levels), group in runs.groupby(["dataset", "oramsNumber", "bucketsNumber", "beta", "useGamma", "levels"]):
+		label = f"{dataset.replace('dataset-', '')} {n} ORAMs, {buckets} buckets, 2^-{beta}{'' if gamma == 'True' else ', no gamma'}{'' if int(levels) == 256 else ', pruned'}"
+		sweeps.setdefault(label, []).extend(zip(group["epsilon"].astype(float), (group["noise"] // n).astype(int), (group["total"] // n).astype(int)))
+
+	return sweeps
+
+
+def toArrays(points):
+	"""
+	Sorted typed arrays (epsilons, noises, totals) of a sweep; repeated epsilons keep the last result.
+	"""
+	points = np.array(points, dtype=[("epsilon", np.float64), ("noise", np.int64), ("total", np.int64)])
+	_, last = np.unique(points["epsilon"][::-1], return_index=True)
+	points = points[::-1][last]
+	return points["epsilon"], points["noise"], points["total"]
+
+
+def main():
+
+	logs, caches, store, output, show = parse()
+
+	sweeps = {}
+	for log in logs:
+		with open(log, "r", errors="replace") as file:
+			readSweeps(file, sweeps)
+	for cache in caches:
+		readCache(cache, sweeps)
+	if store is not None:
+		readStore(store, sweeps)
+	if len(logs) == 0 and len(caches) == 0 and store is None:
+		readSweeps(DEFAULT_INPUT.splitlines(), sweeps)
+
+	for label, points in sweeps.items():
+		logging.info(f"{label}: {len(points)} points")
+
+	plotEpsilons({label: toArrays(points) for label, points in sweeps.items()}, output, show)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,12 @@
 #!/usr/bin/env python3
 
+# Figures are drawn in-process by svg_charts by default; only --renderer bokeh needs a browser.
 # For bokeh 2.3.0 had to install miniconda, and run
 # conda install selenium python-chromedriver-binary=89 -c conda-forge
+#
+# Bokeh, Selenium, svg_concat (lxml) and PyPDF2 are imported by the functions that use them,
+# so importing this module for its chart builders and data is cheap; run it to build the figures.
 
-from bokeh.io import show, export_svgs
-from bokeh.models import ColumnDataSource, LabelSet, Legend, FactorRange, FuncTickFormatter
-from bokeh.plotting import figure
-from bokeh.layouts import gridplot
-from bokeh.transform import dodge, factor_cmap
-import svg_stack as ss
 import subprocess
 
 default_height = 200
@@ -38,20 +36,30 @@ def configure_plot(plot, title):
 		plot.title = None
 
 	plot.yaxis[0].axis_label_standoff = 10
+	plot.yaxis[0].axis_label = axis_label(title)
+
+	return plot
+
+
+def axis_label(title):
 	if title == "Epsilon effect":
-		plot.yaxis[0].axis_label = "Number of records"
+		return "Number of records"
 	elif title == "Linear Scan":
-		plot.yaxis[0].axis_label = "Query overhead in s"
+		return "Query overhead in s"
 	elif title == "Mechanism":
-		plot.yaxis[0].axis_label = "Query overhead"
+		return "Query overhead"
+	elif title == "Latency CDF":
+		return "Fraction of queries"
+	elif title.startswith("Latency"):
+		return "Query latency in ms"
 	else:
-		plot.yaxis[0].axis_label = "Query overhead in ms"
+		return "Query overhead in ms"
 
-	return plot
-
-
-def make_barchart(bins, values, title, color, width, height, scale):
 
+def barchart_style(values, title, color, width):
+	"""
+	Colors, width, y range coefficient and labels of a bar chart; color is modified in place.
+	"""
 	coefficient = 1.2
 
 	if len(values) == 3:
@@ -62,15 +70,26 @@ def make_barchart(bins, values, title, color, width, height, scale):
 		del color[2]
 		coefficient = 1.0
 
-	data = dict(bins=bins, values=values, color=["#%02x%02x%02x" % x for x in color], labels=values.copy())
+	labels = values.copy()
 
 	if title == "Mechanism":
 		coefficient = 5.0
-		data["labels"][0] = "97 ms"
-		data["labels"][1] = "220 ms"
-		data["labels"][2] = "840 ms"
-		data["labels"][3] = "15 s"
-		data["labels"][4] = "19.5 min"
+		labels[0] = "97 ms"
+		labels[1] = "220 ms"
+		labels[2] = "840 ms"
+		labels[3] = "15 s"
+		labels[4] = "19.5 min"
+
+	return ["#%02x%02x%02x" % x for x in color], width, coefficient, labels
+
+
+def make_barchart(bins, values, title, color, width, height, scale):
+	from bokeh.models import ColumnDataSource, LabelSet, FuncTickFormatter
+	from bokeh.plotting import figure
+
+	color, width, coefficient, labels = barchart_style(values, title, color, width)
+
+	data = dict(bins=bins, values=values, color=color, labels=labels)
 
 	source = ColumnDataSource(data=data)
 
@@ -111,6 +130,9 @@ def make_barchart(bins, values, title, color, width, height, scale):
 
 
 def make_barchart_double(bins, values1, values2, title, color1, color2, width, height):
+	from bokeh.models import ColumnDataSource, LabelSet
+	from bokeh.plotting import figure
+	from bokeh.transform import dodge
 
 	source = ColumnDataSource(data={
 		'bins': bins,
@@ -159,10 +181,18 @@ def make_barchart_double(bins, values1, values2, title, color1, color2, width, h
 	return plot
 
 
+epsilons_data = (
+	['0.01', '0.025', '0.05', '0.075', '0.1', '0.25', '0.5', '0.6', '0.693', '0.7', '0.8', '0.9', '1'],
+	['1959', '851', '469', '337', '270', '146', '103', '95', '90', '90', '86', '83', '80'],
+	['2039', '931', '548', '417', '350', '225', '182', '175', '170', '170', '165', '162', '160'],
+)
+
+
 def epsilons_plot(title, colors, width, height):
-	epsilons = ['0.01', '0.025', '0.05', '0.075', '0.1', '0.25', '0.5', '0.6', '0.693', '0.7', '0.8', '0.9', '1']
-	noises = ['1959', '851', '469', '337', '270', '146', '103', '95', '90', '90', '86', '83', '80']
-	totals = ['2039', '931', '548', '417', '350', '225', '182', '175', '170', '170', '165', '162', '160']
+	from bokeh.models import Legend
+	from bokeh.plotting import figure
+
+	epsilons, noises, totals = epsilons_data
 
 	lineSize = 2
 	circleSize = 3
@@ -184,35 +214,47 @@ def epsilons_plot(title, colors, width, height):
 	return plot
 
 
+strawman_categories = ["Record size", "Data size", "Threads"]
+strawman_factors = [
+	(strawman_categories[0], "1KB"),
+	(strawman_categories[0], "4KB"),
+	(strawman_categories[0], "16KB"),
+	#
+	(strawman_categories[1], "100K"),
+	(strawman_categories[1], "1M"),
+	(strawman_categories[1], "10M"),
+	#
+	(strawman_categories[2], "16"),
+	(strawman_categories[2], "32"),
+	(strawman_categories[2], "64"),
+]
+strawman_values = [
+	3884,
+	15000,
+	48000,
+	#
+	922,
+	15000,
+	147000,
+	#
+	22000,
+	15000,
+	15000,
+]
+
+
+def strawman_labels(values):
+	return [f"{round(value / 1000, 1) if value < 4000 else int(value / 1000)} s" for value in values]
+
+
 def plot_strawman(title, colors, width, height):
-	categories = ["Record size", "Data size", "Threads"]
-	factors = [
-		(categories[0], "1KB"),
-		(categories[0], "4KB"),
-		(categories[0], "16KB"),
-		#
-		(categories[1], "100K"),
-		(categories[1], "1M"),
-		(categories[1], "10M"),
-		#
-		(categories[2], "16"),
-		(categories[2], "32"),
-		(categories[2], "64"),
-	]
-
-	x = [
-		3884,
-		15000,
-		48000,
-		#
-		922,
-		15000,
-		147000,
-		#
-		22000,
-		15000,
-		15000,
-	]
+	from bokeh.models import ColumnDataSource, LabelSet, FactorRange, FuncTickFormatter
+	from bokeh.plotting import figure
+	from bokeh.transform import factor_cmap
+
+	categories = strawman_categories
+	factors = strawman_factors
+	x = strawman_values
 
 	del colors[1]
 	del colors[2]
@@ -231,7 +273,7 @@ def plot_strawman(title, colors, width, height):
 		source=ColumnDataSource(data=dict(
 			x=x,
 			factors=factors,
-			labels=[f"{round(value / 1000, 1) if value < 4000 else int(value / 1000)} s" for value in x],
+			labels=strawman_labels(x),
 		), ),
 		render_mode='canvas',
 		text_font_size="8pt",
@@ -254,6 +296,151 @@ return 10 +
 	return plot
 
 
+# glyph budgets of the latency figures, whatever the number of queries behind them
+cdf_points = 200
+percentile_levels = [5, 25, 50, 75, 95]
+# the store has per-query latencies but no timestamps: the time axis is the latencies added up, without idle gaps or overlap
+latency_time_label = "Cumulative service time in s"
+
+
+def latency_cdf(samples, points=cdf_points):
+	"""
+	Empirical CDF of positive samples at points log-spaced values, from one histogram pass instead of a sort.
+	Returns the values and the fraction of samples at or below each; both are empty without positive samples.
+	"""
+	import numpy as np
+
+	samples = samples[samples > 0]
+	if len(samples) == 0:
+		return np.empty(0), np.empty(0)
+	low, high = samples.min(), samples.max()
+	if low == high:
+		return np.array([low, low]), np.array([0.0, 1.0])
+
+	counts, edges = np.histogram(samples, bins=np.geomspace(low, high, points))
+	return edges, np.concatenate([[0.0], np.cumsum(counts) / len(samples)])
+
+
+def latency_percentiles(groups, levels=percentile_levels):
+	"""
+	A row of the given percentiles per sample array.
+	"""
+	import numpy as np
+
+	return np.array([np.percentile(samples, levels) for samples in groups])
+
+
+def decimate(x, y, columns):
+	"""
+	Min/max decimation: the lowest and highest point of each of columns equal x intervals, in x order.
+	At most 2 * columns points are left, and every peak and dip of the series survives.
+	"""
+	import numpy as np
+
+	if len(x) <= 2 * columns:
+		return x, y
+
+	order = np.argsort(x, kind="stable")
+	x, y = x[order], y[order]
+	column = np.minimum(((x - x[0]) / ((x[-1] - x[0]) or 1) * columns).astype(np.int64), columns - 1)
+
+	# within each column (x is sorted, so columns are contiguous) the first index by value is the minimum, the last the maximum
+	byValue = np.lexsort((y, column))
+	starts = np.flatnonzero(np.concatenate([[True], column[1:] != column[:-1]]))
+	ends = np.concatenate([starts[1:], [len(x)]]) - 1
+	picked = np.unique(np.concatenate([byValue[starts], byValue[ends]]))
+
+	return x[picked], y[picked]
+
+
+def latency_samples(store, query):
+	"""
+	Per-query latencies in ms of the runs matching query["where"], one array per value of query["x"] (or a single array without x).
+	"""
+	latencies = store.latencies(**query.get("where", {}))
+	if "x" not in query:
+		return [latencies["seconds"].to_numpy() * 1000]
+
+	runs = store.runs(columns=[query["x"]], **query.get("where", {}))
+	if query["x"] not in runs:
+		return [latencies["seconds"].to_numpy()[:0] for _ in query["values"]]
+
+	groups = []
+	for value in query["values"]:
+		matching = runs.index[(runs[query["x"]] - value).abs() < 1e-9]
+		groups += [latencies.loc[latencies["run"].isin(matching), "seconds"].to_numpy() * 1000]
+	return groups
+
+
+def resolve_latencies(piece, store):
+	"""
+	The latency piece with its samples reduced to bounded plot data (series, percentiles or a decimated time series), or None without samples.
+	"""
+	import numpy as np
+
+	query = piece["query"]
+	if piece["special"] == "latency-time":
+		latencies = store.latencies(**query.get("where", {}))
+		if len(latencies) == 0:
+			return None
+		# the most recent matching run, its queries laid out back to back (see latency_time_label)
+		seconds = latencies.loc[latencies["run"] == latencies["run"].max(), "seconds"].to_numpy()
+		times, values = decimate(np.cumsum(seconds), seconds * 1000, piece["width"])
+		return dict(piece, times=times.tolist(), latencies=values.tolist())
+
+	groups = latency_samples(store, query)
+	if any(len(samples) == 0 for samples in groups):
+		return None
+
+	if piece["special"] == "latency-cdf":
+		series = []
+		for value, samples in zip(query["values"], groups):
+			xs, ys = latency_cdf(samples)
+			series += [(f"{query['x']} = {value}", xs.tolist(), ys.tolist())]
+		if all(len(xs) == 0 for _, xs, _ in series):
+			return None
+		return dict(piece, series=series)
+
+	return dict(piece, x=list(query["values"]), percentiles=latency_percentiles(groups).tolist(), levels=[f"p{level}" for level in percentile_levels])
+
+
+def latency_cdf_plot(title, series, colors, width, height):
+	from bokeh.plotting import figure
+
+	plot = figure(title=title, x_axis_type="log", y_range=(0, 1), x_axis_label="Query latency in ms", plot_width=width, plot_height=height, toolbar_location=None, tools="")
+
+	for (label, xs, ys), color in zip(series, colors):
+		plot.line(xs, ys, line_width=2, color="#%02x%02x%02x" % color, legend_label=label)
+
+	plot.legend.location = "bottom_right"
+	return plot
+
+
+def latency_percentiles_plot(title, x, percentiles, levels, color, width, height):
+	from bokeh.plotting import figure
+
+	plot = figure(title=title, x_axis_label="epsilon", plot_width=width, plot_height=height, toolbar_location=None, tools="")
+
+	count = len(levels)
+	for i in range(count // 2):
+		plot.varea(x=x, y1=[row[i] for row in percentiles], y2=[row[count - 1 - i] for row in percentiles], fill_color="#%02x%02x%02x" % color, fill_alpha=0.2 + 0.25 * i, legend_label=f"{levels[i]}–{levels[count - 1 - i]}")
+	middle = [row[count // 2] for row in percentiles]
+	plot.line(x, middle, line_width=2, color="#%02x%02x%02x" % color, legend_label=levels[count // 2])
+	plot.circle(x, middle, size=3, color="#%02x%02x%02x" % color)
+
+	plot.legend.location = "top_left"
+	return plot
+
+
+def latency_time_plot(title, times, latencies, color, width, height):
+	from bokeh.plotting import figure
+
+	plot = figure(title=title, x_axis_label=latency_time_label, plot_width=width, plot_height=height, toolbar_location=None, tools="")
+	plot.line(times, latencies, line_width=1, color="#%02x%02x%02x" % color)
+
+	return plot
+
+
 colors = {
 	"turquoise": [
 		(49, 87, 84),
@@ -351,6 +538,7 @@ data = [
 		"title": "Epsilon",
 		"bins": ["0.1", "0.5", "ln(2)", "1.0", "ln(3)"],
 		"values": [2293, 868, 840, 816, 783],
+		"query": {"x": "epsilon", "values": [0.1, 0.5, 0.693, 1.0, 1.099], "y": "latency", "scale": 1000, "where": {"oramsNumber": 64, "virtualRequests": False}},
 		"color": colors["blue"],
 		"width": default_width,
 		"height": default_height,
@@ -451,30 +639,115 @@ data = [
 	},
 ]
 
+# drawn only from a results store (--store); they are not part of the composite
+latency_data = [
+	{
+		"special": "latency-cdf",
+		"title": "Latency CDF",
+		"query": {"x": "epsilon", "values": [0.1, 0.693, 1.0], "where": {"oramsNumber": 64, "virtualRequests": False}},
+		"color": [colors["blue"][0], colors["rose"][0], colors["ochre"][0]],
+		"width": default_width,
+		"height": default_height,
+	},
+	{
+		"special": "latency-percentiles",
+		"title": "Latency percentiles",
+		"query": {"x": "epsilon", "values": [0.1, 0.5, 0.693, 1.0, 1.099], "where": {"oramsNumber": 64, "virtualRequests": False}},
+		"color": colors["violet"][0],
+		"width": default_width,
+		"height": default_height,
+	},
+	{
+		"special": "latency-time",
+		"title": "Latency by query",
+		"query": {"where": {"oramsNumber": 64, "epsilon": 0.693, "virtualRequests": False}},
+		"color": colors["storm"][0],
+		"width": default_width * 2,
+		"height": default_height,
+	},
+]
+
+
+def find_inkscape():
+	"""
+	Inkscape on the PATH, else the macOS application, or None without Inkscape (figures are then only SVGs).
+	"""
+	import os
+	import shutil
+
+	application = "/Applications/Inkscape.app/Contents/MacOS/inkscape"
+	return shutil.which("inkscape") or (application if os.path.exists(application) else None)
+
+
+inkscape = find_inkscape()
+
+
+class InkscapeShell(object):
+	"""
+	A persistent `inkscape --shell` process converting SVGs one action line at a time, instead of a new Inkscape per figure.
+	"""
+
+	def __init__(self):
+		self._process = subprocess.Popen([inkscape, "--shell"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, bufsize=0)
+		self._prompt()
+
+	def _prompt(self):
+		# every command ends with a "> " prompt
+		output = ""
+		while not output.endswith("> "):
+			char = self._process.stdout.read(1)
+			if not char:
+				raise RuntimeError("Inkscape shell exited")
+			output += char
+		return output
+
+	def run(self, actions):
+		self._process.stdin.write("; ".join(actions) + "\n")
+		self._process.stdin.flush()
+		return self._prompt()
+
+	def export(self, svg, pdf, text_to_path=True, latex=False):
+		self.run([f"file-open:{svg}", "export-area-drawing"] + (["export-text-to-path"] if text_to_path else []) + (["export-latex"] if latex else []) + [f"export-filename:{pdf}", "export-do", "file-close"])
 
-def export_pdf(title, put_to_paper):
-	subprocess.Popen([
-		"/Applications/Inkscape.app/Contents/MacOS/inkscape",
-		"-D",
-		"-T",
-		f"../output/{title}.svg",
-		"-o",
-		f"../output/{title}.pdf",
-	], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+	def close(self):
+		self._process.stdin.write("quit\n")
+		self._process.stdin.close()
+		self._process.wait()
+
+
+def export_pdf(title, put_to_paper, shell=None):
+	import shutil
+
+	if shell is not None:
+		shell.export(f"../output/{title}.svg", f"../output/{title}.pdf")
+	else:
+		subprocess.Popen([
+			inkscape,
+			"-D",
+			"-T",
+			f"../output/{title}.svg",
+			"-o",
+			f"../output/{title}.pdf",
+		], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
 
 	if put_to_paper:
-		subprocess.Popen(["cp", f"../output/{title}.pdf", "../../dp-oram-paper/document/graphics"]).communicate()
+		shutil.copy(f"../output/{title}.pdf", "../../dp-oram-paper/document/graphics")
 
 
-def export_pdf_latex(title, put_to_paper):
-	subprocess.Popen([
-		"/Applications/Inkscape.app/Contents/MacOS/inkscape",
-		"-D",
-		f"../output/{title}.svg",
-		"-o",
-		f"../output/{title}.pdf",
-		"--export-latex",
-	], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+def export_pdf_latex(title, put_to_paper, shell=None):
+	import shutil
+
+	if shell is not None:
+		shell.export(f"../output/{title}.svg", f"../output/{title}.pdf", text_to_path=False, latex=True)
+	else:
+		subprocess.Popen([
+			inkscape,
+			"-D",
+			f"../output/{title}.svg",
+			"-o",
+			f"../output/{title}.pdf",
+			"--export-latex",
+		], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
 
 	# FIXES
 	with open(f"../output/{title}.pdf_tex", "r") as file:
@@ -498,8 +771,8 @@ def export_pdf_latex(title, put_to_paper):
 		file.write(filedata)
 
 	if put_to_paper:
-		subprocess.Popen(["cp", f"../output/{title}.pdf", "../../dp-oram-paper/document/graphics"]).communicate()
-		subprocess.Popen(["cp", f"../output/{title}.pdf_tex", "../../dp-oram-paper/document/figures/pdf_tex"]).communicate()
+		shutil.copy(f"../output/{title}.pdf", "../../dp-oram-paper/document/graphics")
+		shutil.copy(f"../output/{title}.pdf_tex", "../../dp-oram-paper/document/figures/pdf_tex")
 
 	if export_to_figures:
 		f = open(f"../../dp-oram-paper/document/figures/fig-{title}.tex", "w+")
@@ -515,35 +788,69 @@ def export_pdf_latex(title, put_to_paper):
 		print(f"\includeExperimentPlot{{\\normalsize}}{{0.5}}{{{title}}}{{{title}}}")
 
 
-doc = ss.Document()
+def parse():
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Build the paper figures")
+
+	parser.add_argument("--only", dest="only", metavar="figure", type=str, nargs='+', default=None, help=f"Build only these figures (by file name, such as \"epsilon\" or \"data-size\").")
+	parser.add_argument("--list", dest="list", default=False, help="Print the figure names and exit", action="store_true")
+	parser.add_argument("--force", dest="force", default=False, help="Rebuild figures even if their spec and data did not change", action="store_true")
+	parser.add_argument("--store", dest="store", metavar="store", type=str, default=None, help=f"Results store to resolve figure queries against; figures keep their literal values without it.")
+	parser.add_argument("--renderer", dest="renderer", metavar="renderer", type=str, choices=["native", "bokeh"], default="native", help=f"Draw figures in-process (native) or through Bokeh and a headless browser.")
+	parser.add_argument("--jobs", dest="jobs", metavar="jobs", type=int, default=None, help=f"Figures rendered concurrently, each worker with its own browser and Inkscape shell (all cores by default).")
+	parser.add_argument("--no-paper", dest="paper", default=True, help="Do not copy figures into the paper repository", action="store_false")
 
-layout = ss.VBoxLayout()
-count = 0
-layout_horizontal = ss.HBoxLayout()
+	return parser.parse_args()
 
-import os
-import shutil
 
-from chromedriver_binary.utils import get_chromedriver_path
-from selenium.webdriver import Chrome, ChromeOptions
+def figure_name(piece):
+	return piece['title'].lower().replace(' ', '-').replace('(', '').replace(')', '')
 
-options = ChromeOptions()
-options.binary_location = shutil.which('chrome')
 
-options.add_argument('--headless')
-options.add_argument('--disable-gpu')
-options.add_argument("--no-sandbox")
+def query_values(store, query):
+	"""
+	Values of query["y"] (median over runs, times query["scale"]) for each of query["values"] of query["x"], among runs matching query["where"].
+	query["y"] is a run column (duration, total, ...) or "latency", the mean per-query latency of a run. Returns None unless every value has runs.
+	"""
+	runs = store.runs(columns=list(query.get("where", {})) + [query["x"]], **query.get("where", {}))
+	if len(runs) == 0 or query["x"] not in runs:
+		return None
+	if query["y"] == "latency":
+		runs["latency"] = store.latencies(**query.get("where", {})).groupby("run")["seconds"].mean()
 
-# web_driver = Chrome(executable_path=os.path.join(get_chromedriver_path(), 'chromedriver'), options=options)
-web_driver = Chrome(executable_path="/usr/local/bin/chromedriver", options=options)
+	values = []
+	for x in query["values"]:
+		matching = runs[(runs[query["x"]] - x).abs() < 1e-9][query["y"]].dropna()
+		if len(matching) == 0:
+			return None
+		values += [int(round(matching.median() * query.get("scale", 1)))]
 
-for piece in data:
-	if count == 3 or count == 8:
-		layout.addLayout(layout_horizontal)
-		layout_horizontal = ss.HBoxLayout()
+	return values
 
-	plot = None
-	print(piece["title"])
+
+def resolve(piece, store):
+	"""
+	The piece with its query (if any) resolved against the results store; None for latency pieces without samples.
+	"""
+	if piece.get("special", "").startswith("latency"):
+		resolved = resolve_latencies(piece, store) if store is not None else None
+		if resolved is None:
+			print(f"{piece['title']}: no latencies {'for its query' if store is not None else 'without --store'}, skipping")
+		return resolved
+
+	if store is None or "query" not in piece:
+		return piece
+
+	values = query_values(store, piece["query"])
+	if values is None:
+		print(f"{piece['title']}: no results for its query, keeping literal values")
+		return piece
+
+	return dict(piece, values=values)
+
+
+def build(piece):
 	if "values" in piece:
 		plot = make_barchart(piece["bins"], piece["values"], piece["title"], piece["color"].copy(), piece["width"], piece["height"], "auto" if piece["title"] != "Mechanism" else "log")
 	elif "values1" in piece:
@@ -552,20 +859,274 @@ for piece in data:
 		plot = epsilons_plot(piece["title"], piece["color"], piece["width"], piece["height"])
 	elif "special" in piece and piece["special"] == "strawman":
 		plot = plot_strawman(piece["title"], piece["color"].copy(), piece["width"], piece["height"])
-	plot = configure_plot(plot, piece["title"])
-	plot.output_backend = "svg"
-	title_sanitized = piece['title'].lower().replace(' ', '-').replace('(', '').replace(')', '')
-	name = f"../output/{title_sanitized}.svg"
-	export_svgs(plot, filename=name, webdriver=web_driver)
-	# export_pdf_latex(title_sanitized, True)
-	export_pdf(title_sanitized, True)
+	elif piece.get("special") == "latency-cdf":
+		plot = latency_cdf_plot(piece["title"], piece["series"], piece["color"], piece["width"], piece["height"])
+	elif piece.get("special") == "latency-percentiles":
+		plot = latency_percentiles_plot(piece["title"], piece["x"], piece["percentiles"], piece["levels"], piece["color"], piece["width"], piece["height"])
+	elif piece.get("special") == "latency-time":
+		plot = latency_time_plot(piece["title"], piece["times"], piece["latencies"], piece["color"], piece["width"], piece["height"])
+	return configure_plot(plot, piece["title"])
+
+
+def build_native(piece):
+	"""
+	The figure drawn by svg_charts, with the same data preparation as the Bokeh builders.
+	"""
+	import svg_charts
+
+	title = piece["title"]
+	if "values" in piece:
+		color, width, coefficient, labels = barchart_style(piece["values"], title, piece["color"].copy(), piece["width"])
+		return svg_charts.barchart(piece["bins"], piece["values"], color, labels, width, piece["height"], (10, max(piece["values"]) * coefficient), y_log=title == "Mechanism", y_label=axis_label(title))
+	elif "values1" in piece:
+		return svg_charts.barchart_double(piece["bins"], piece["values1"], piece["values2"], piece["color1"], piece["color2"], piece["width"], piece["height"], y_label=axis_label(title))
+	elif piece.get("special") == "epsilons":
+		epsilons, noises, totals = epsilons_data
+		series = [("Noise records", epsilons, noises, piece["color"][0]), ("Total records", epsilons, totals, piece["color"][1])]
+		return svg_charts.line_chart(series, piece["width"], piece["height"], y_label=axis_label(title))
+	elif piece.get("special") == "strawman":
+		colors = piece["color"].copy()
+		del colors[1]
+		del colors[2]
+		return svg_charts.grouped_log_barchart(strawman_factors, strawman_values, colors, strawman_labels(strawman_values), piece["width"], piece["height"], (10, max(strawman_values) * 5), y_label=axis_label(title))
+	elif piece.get("special") == "latency-cdf":
+		series = [(label, xs, ys, color) for (label, xs, ys), color in zip(piece["series"], piece["color"])]
+		return svg_charts.cdf_chart(series, piece["width"], piece["height"], x_label="Query latency in ms", y_label=axis_label(title))
+	elif piece.get("special") == "latency-percentiles":
+		return svg_charts.band_chart(piece["x"], piece["percentiles"], piece["levels"], piece["color"], piece["width"], piece["height"], x_label=piece["query"]["x"], y_label=axis_label(title))
+	elif piece.get("special") == "latency-time":
+		return svg_charts.time_series_chart(piece["times"], piece["latencies"], piece["color"], piece["width"], piece["height"], x_label=latency_time_label, y_label=axis_label(title))
+
+
+def builders(piece):
+	if "values" in piece:
+		return [make_barchart]
+	elif "values1" in piece:
+		return [make_barchart_double]
+	elif piece.get("special") == "epsilons":
+		return [epsilons_plot]
+	elif piece.get("special") == "latency-cdf":
+		return [latency_cdf_plot]
+	elif piece.get("special") == "latency-percentiles":
+		return [latency_percentiles_plot]
+	elif piece.get("special") == "latency-time":
+		return [latency_time_plot]
+	return [plot_strawman]
+
+
+def figure_hash(piece, put_to_paper, renderer):
+	"""
+	Digest of everything a figure depends on: its resolved spec, the code of its builders and the export settings.
+	"""
+	import hashlib
+	import inspect
+	import json
+
+	spec = {name: value for name, value in piece.items() if name != "query"}
+	if renderer == "native":
+		import svg_charts
+		code = inspect.getsource(build_native) + inspect.getsource(svg_charts)
+	else:
+		code = "".join(inspect.getsource(function) for function in builders(piece) + [configure_plot])
+	code += inspect.getsource(barchart_style) + inspect.getsource(axis_label) + inspect.getsource(export_pdf)
+	return hashlib.sha256(json.dumps([spec, code, no_title, put_to_paper, renderer], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def load_manifest(path):
+	import json
+	import os
+
+	if not os.path.exists(path):
+		return {}
+	with open(path) as file:
+		return json.load(file)
+
+
+def save_manifest(path, manifest):
+	import json
+	import os
+
+	with open(f"{path}.tmp", "w") as file:
+		json.dump(manifest, file, indent=1, sort_keys=True)
+	os.replace(f"{path}.tmp", path)
 
-	layout_horizontal.addSVG(name, alignment=ss.AlignTop | ss.AlignHCenter)
 
-	count += 1
+def make_web_driver():
+	import shutil
+
+	from selenium.webdriver import Chrome, ChromeOptions
 
-layout.addLayout(layout_horizontal)
-doc.setLayout(layout)
-doc.save("../output/plots.svg")
+	options = ChromeOptions()
+	options.binary_location = shutil.which('chrome')
 
-# export_pdf_latex("plots", False)
+	options.add_argument('--headless')
+	options.add_argument('--disable-gpu')
+	options.add_argument("--no-sandbox")
+
+	# from chromedriver_binary.utils import get_chromedriver_path
+	# return Chrome(executable_path=os.path.join(get_chromedriver_path(), 'chromedriver'), options=options)
+	return Chrome(executable_path="/usr/local/bin/chromedriver", options=options)
+
+
+class ExportPool(object):
+	"""
+	Worker threads rendering figures, each with a reusable Inkscape shell (and a headless browser for Bokeh) started on its first figure.
+	Without Inkscape only the SVGs are written.
+	"""
+
+	def __init__(self, jobs, put_to_paper, renderer):
+		import threading
+		from concurrent.futures import ThreadPoolExecutor
+
+		self._put_to_paper = put_to_paper
+		self._renderer = renderer
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._resources = []
+		self._executor = ThreadPoolExecutor(max_workers=jobs)
+
+	def _worker(self):
+		if not hasattr(self._local, "shell"):
+			self._local.web_driver = make_web_driver() if self._renderer == "bokeh" else None
+			self._local.shell = None
+			with self._lock:
+				self._resources += [self._local.__dict__]
+		return self._local.web_driver
+
+	def _shell(self):
+		# started once the worker's first SVG is written, so a failing Inkscape costs no figure
+		if self._local.shell is None:
+			self._local.shell = InkscapeShell()
+		return self._local.shell
+
+	def _render(self, piece):
+		web_driver = self._worker()
+		name = figure_name(piece)
+
+		if self._renderer == "native":
+			build_native(piece).save(f"../output/{name}.svg")
+		else:
+			from bokeh.io import export_svgs
+
+			plot = build(piece)
+			plot.output_backend = "svg"
+			export_svgs(plot, filename=f"../output/{name}.svg", webdriver=web_driver)
+		if inkscape is not None:
+			# export_pdf_latex(name, self._put_to_paper, self._shell())
+			export_pdf(name, self._put_to_paper, self._shell())
+
+		return name
+
+	def render(self, pieces):
+		"""
+		Renders the pieces concurrently, yielding figure names as they finish.
+		"""
+		from concurrent.futures import as_completed
+
+		for future in as_completed([self._executor.submit(self._render, piece) for piece in pieces]):
+			yield future.result()
+
+	def close(self):
+		self._executor.shutdown()
+		for resources in self._resources:
+			if resources["web_driver"] is not None:
+				resources["web_driver"].quit()
+			if resources["shell"] is not None:
+				resources["shell"].close()
+
+
+def compose(names, filename):
+	"""
+	Stacks the rendered figures into one SVG, in rows breaking before the 4th and 9th figure.
+	"""
+	import os
+	import svg_concat as ss
+
+	doc = ss.Document()
+
+	layout = ss.VBoxLayout()
+	layout_horizontal = ss.HBoxLayout()
+
+	for count, name in enumerate(names):
+		if count == 3 or count == 8:
+			layout.addLayout(layout_horizontal)
+			layout_horizontal = ss.HBoxLayout()
+
+		if os.path.exists(f"../output/{name}.svg"):
+			layout_horizontal.addSVG(f"../output/{name}.svg", alignment=ss.AlignTop | ss.AlignHCenter)
+
+	layout.addLayout(layout_horizontal)
+	doc.setLayout(layout)
+	doc.save(filename)
+
+
+def main():
+	import os
+
+	args = parse()
+
+	names = [figure_name(piece) for piece in data]
+	if args.list:
+		for piece in data + latency_data:
+			print(f"{figure_name(piece):<24}{piece['title']}")
+		return
+	if args.only is not None:
+		known = names + [figure_name(piece) for piece in latency_data]
+		unknown = set(args.only) - set(known)
+		if unknown:
+			raise ValueError(f"Unknown figures {sorted(unknown)}; known are {known}")
+
+	store = None
+	if args.store is not None:
+		from results import ResultStore
+		store = ResultStore(args.store)
+
+	manifest_path = "../output/figures.json"
+	manifest = load_manifest(manifest_path)
+
+	extensions = ["svg"]
+	if inkscape is not None:
+		extensions += ["pdf"]
+	else:
+		print("Inkscape not found, skipping PDF export")
+
+	pending = {}
+	for piece in data + latency_data:
+		name = figure_name(piece)
+		if args.only is not None and name not in args.only:
+			continue
+		# the latency figures are only drawn from a store, or when asked for by name
+		if piece in latency_data and store is None and args.only is None:
+			continue
+
+		piece = resolve(piece, store)
+		if piece is None:
+			continue
+		digest = figure_hash(piece, args.paper, args.renderer)
+		if not args.force and manifest.get(name) == digest and all(os.path.exists(f"../output/{name}.{extension}") for extension in extensions):
+			print(f"{piece['title']} (cached)")
+			continue
+
+		pending[name] = (piece, digest)
+
+	if store is not None:
+		store.close()
+
+	if len(pending) > 0:
+		pool = ExportPool(min(args.jobs or os.cpu_count(), len(pending)), args.paper, args.renderer)
+		try:
+			for name in pool.render([piece for piece, _ in pending.values()]):
+				print(pending[name][0]["title"])
+				manifest[name] = pending[name][1]
+				save_manifest(manifest_path, manifest)
+		finally:
+			pool.close()
+
+	# the composite uses every figure, so it is redone only when one of them changed or it is missing
+	if len(pending) > 0 or not os.path.exists("../output/plots.svg"):
+		compose(names, "../output/plots.svg")
+		# export_pdf_latex("plots", False)
+
+
+if __name__ == "__main__":
+	main()
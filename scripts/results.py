@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""
+Central SQLite store of experiment results: runs with their parameters and records per query, per-query latencies
+and resource telemetry. sweep.py and scaling.py write to it, sweep caches and bin/main logs can be imported, and
+queries come back as pandas frames or NumPy arrays filtered by parameters through indexed lookups.
+"""
+
+import os
+import sqlite3
+import numpy as np
+
+from telemetry import FIELDS
+
+RECORDS = ["real", "padding", "noise", "total"]
+
+
+def storedValue(value):
+	"""
+	A parameter value as the store keeps it: numbers, and numeric strings such as bin/main logs give, as str(float), like sweep.normalizeValue.
+	"""
+	if isinstance(value, bool):
+		return str(value)
+	try:
+		return str(float(value))
+	except (TypeError, ValueError):
+		return str(value)
+
+
+class ResultStore(object):
+	def __init__(self, path):
+		self._connection = sqlite3.connect(path)
+		self._connection.executescript(f"""
+			CREATE TABLE IF NOT EXISTS runs (
+				id INTEGER PRIMARY KEY,
+				key TEXT UNIQUE,
+				source TEXT NOT NULL,
+				start REAL,
+				duration REAL,
+				returncode INTEGER,
+				{", ".join(f"{name} INTEGER" for name in RECORDS)}
+			);
+			CREATE TABLE IF NOT EXISTS parameters (
+				run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+				name TEXT NOT NULL,
+				value TEXT NOT NULL,
+				PRIMARY KEY (run, name)
+			);
+			CREATE TABLE IF NOT EXISTS latencies (
+				run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+				query INTEGER NOT NULL,
+				seconds REAL NOT NULL
+			);
+			CREATE TABLE IF NOT EXISTS telemetry (
+				run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+				{", ".join(f"{name} REAL NOT NULL" for name in FIELDS)}
+			);
+			CREATE INDEX IF NOT EXISTS parametersValue ON parameters (name, value);
+			CREATE INDEX IF NOT EXISTS latenciesRun ON latencies (run);
+			CREATE INDEX IF NOT EXISTS telemetryRun ON telemetry (run);
+		""")
+		self._connection.execute("PRAGMA foreign_keys = ON")
+
+	def close(self):
+		self._connection.close()
+
+	def add(self, result, source="sweep", key=None, latencies=None, start=None):
+		"""
+		Stores a sweep.py result dict (parameters, records, duration, returncode and optional telemetry), replacing the run with the same key.
+		Returns the run id.
+		"""
+		records = result.get("records") or {}
+
+		with self._connection:
+			if key is not None:
+				self._connection.execute("DELETE FROM runs WHERE key = ?", (key, ))
+			cursor = self._connection.execute(
+				f"INSERT INTO runs (key, source, start, duration, returncode, {', '.join(RECORDS)}) VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(RECORDS))})",
+				(key, source, start, result.get("duration"), result.get("returncode"), *[records.get(name) for name in RECORDS]),
+			)
+			run = cursor.lastrowid
+
+			self._connection.executemany("INSERT INTO parameters (run, name, value) VALUES (?, ?, ?)", [(run, name, storedValue(value)) for name, value in result["parameters"].items()])
+			if latencies is not None:
+				self._connection.executemany("INSERT INTO latencies (run, query, seconds) VALUES (?, ?, ?)", [(run, i, float(value)) for i, value in enumerate(latencies)])
+			if result.get("telemetry") is not None:
+				series = result["telemetry"]["series"]
+				self._connection.executemany(
+					f"INSERT INTO telemetry (run, {', '.join(FIELDS)}) VALUES (?, {', '.join('?' * len(FIELDS))})",
+					[(run, *row) for row in zip(*[series[name] for name in FIELDS])],
+				)
+
+		return run
+
+	def importCache(self, directory):
+		"""
+		Adds the entries of a sweep.py result cache (keyed by their cache file, so repeated imports do not duplicate). Returns the number imported.
+		"""
+		from sweep import ResultCache
+
+		count = 0
+		for name, entry in ResultCache(directory, None).entries():
+			# the cache file name is the result key sweep.py stores runs under
+			self.add(entry, source=os.path.abspath(directory), key=os.path.splitext(name)[0])
+			count += 1
+		return count
+
+	def importLogs(self, path):
+		"""
+		Adds the runs of a bin/main log or wiki page (parameters and duration only). Returns the number imported.
+		"""
+		from run_logs import parseRuns
+
+		count = 0
+		for run in parseRuns(path):
+			self.add({"parameters": run["parameters"], "duration": run["end"] - run["start"]}, source=os.path.abspath(path), key=f"log:{os.path.abspath(path)}:{run['start']}", start=run["start"])
+			count += 1
+		return count
+
+	def _selection(self, parameters):
+		selection = "SELECT id FROM runs"
+		arguments = []
+		for name, value in parameters.items():
+			selection += f" {'WHERE' if len(arguments) == 0 else 'AND'} id IN (SELECT run FROM parameters WHERE name = ? AND value = ?)"
+			arguments += [name, storedValue(value)]
+		return selection, arguments
+
+	def runs(self, columns=None, **parameters):
+		"""
+		Runs whose parameters equal the given values, one row per run with the run fields and a column per parameter (numeric where possible).
+		columns restricts the parameter columns.
+		"""
+		import pandas as pd
+
+		selection, arguments = self._selection(parameters)
+		frame = pd.read_sql_query(f"SELECT * FROM runs WHERE id IN ({selection})", self._connection, params=arguments, index_col="id")
+		values = pd.read_sql_query(f"SELECT run, name, value FROM parameters WHERE run IN ({selection})", self._connection, params=arguments)
+
+		if columns is not None:
+			values = values[values["name"].isin(columns)]
+		if len(values) > 0:
+			wide = values.pivot(index="run", columns="name", values="value")
+			for name in wide.columns:
+				numeric = pd.to_numeric(wide[name], errors="coerce")
+				if numeric.notna().sum() == wide[name].notna().sum():
+					wide[name] = numeric
+			frame = frame.join(wide)
+
+		return frame
+
+	def latencies(self, **parameters):
+		"""
+		Per-query latencies in seconds of the matching runs as a frame of run, query and seconds.
+		"""
+		import pandas as pd
+
+		selection, arguments = self._selection(parameters)
+		return pd.read_sql_query(f"SELECT run, query, seconds FROM latencies WHERE run IN ({selection}) ORDER BY run, query", self._connection, params=arguments)
+
+	def latencyArray(self, **parameters):
+		"""
+		All matching latencies as one float64 NumPy array.
+		"""
+		selection, arguments = self._selection(parameters)
+		return np.fromiter((row[0] for row in self._connection.execute(f"SELECT seconds FROM latencies WHERE run IN ({selection})", arguments)), dtype=np.float64)
+
+	def telemetry(self, run):
+		"""
+		The telemetry series of a run as a frame with one column per field.
+		"""
+		import pandas as pd
+
+		return pd.read_sql_query(f"SELECT {', '.join(FIELDS)} FROM telemetry WHERE run = ? ORDER BY time", self._connection, params=(run, ))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+"""
+Splits experiment logs (wiki pages or bin/main log files) into runs and timestamped phases.
+
+A run ends at "Log written to"; its parameters are the "name = value" (or "name: value") INFO lines
+before its first phase, and a phase starts at every INFO message ending with "..." ("Generating indices...").
+"""
+
+import re
+import mmap
+import os
+import datetime
+import numpy as np
+
+# one scanner for the whole file; TRACE and DEBUG lines never leave the regex engine
+# anything (thread ids, source locations) may sit between the date and the level
+LINE = re.compile(rb"\[(\d+)/(\d+)/(\d+) (\d+):(\d+):(\d+)\][^\n]*?(?:INFO|WARNING|ERROR):\s*([^\n]*)")
+PARAMETER = re.compile(r"^\s*([\w\- ]+?)\s*[=:]\s*(\S[^=]*?)\s*$")
+
+RUN_END = "Log written to"
+PHASE_SUFFIX = "..."
+
+
+def timestamp(match):
+	# the log's wall clock is read as UTC: only differences matter, and they must not jump at DST changes
+	day, month, year, hour, minute, second = (int(group) for group in match.groups()[:6])
+	return datetime.datetime(year=year, month=month, day=day, hour=hour, minute=minute, second=second, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def parseRuns(path, offset=0):
+	"""
+	Yields runs found in path starting at byte offset. A run is a dict with
+	file, start, end (seconds, the log's wall clock read as UTC), parameters (dict), phases (list of (name, start, end)) and offset (byte offset past the run).
+	"""
+	size = os.path.getsize(path)
+	if size <= offset:
+		return
+
+	with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		parameters = {}
+		phases = []
+
+		for match in LINE.finditer(data, offset):
+			message = match.group(7).decode("utf-8", errors="replace").rstrip()
+
+			if RUN_END in message:
+				if len(phases) > 0:
+					end = timestamp(match)
+					yield {
+						"file": path,
+						"start": phases[0][1],
+						"end": end,
+						"parameters": parameters,
+						"phases": [(name, start, phases[i + 1][1] if i + 1 < len(phases) else end) for i, (name, start) in enumerate(phases)],
+						"offset": match.end(),
+					}
+				parameters = {}
+				phases = []
+
+			elif message.endswith(PHASE_SUFFIX):
+				phases += [(message[:-len(PHASE_SUFFIX)].strip(), timestamp(match))]
+
+			elif len(phases) == 0:
+				parameter = PARAMETER.match(message)
+				if parameter:
+					parameters[parameter.group(1).strip()] = parameter.group(2)
+
+
+def configuration(run, keys=None):
+	"""
+	Hashable parameter set of a run, optionally restricted to keys.
+	"""
+	return tuple(sorted((key, value) for key, value in run["parameters"].items() if keys is None or key in keys))
+
+
+def phaseDurations(runs):
+	"""
+	Maps phase name to a NumPy array of its durations in seconds across runs.
+	"""
+	durations = {}
+	for run in runs:
+		for name, start, end in run["phases"]:
+			durations.setdefault(name, []).append(end - start)
+
+	return {name: np.array(values) for name, values in durations.items()}
+
+
+def summary(values):
+	return {
+		"count": len(values),
+		"mean": float(np.mean(values)),
+		"median": float(np.median(values)),
+		"p90": float(np.percentile(values, 90)),
+		"max": float(np.max(values)),
+		"total": float(np.sum(values)),
+	}
+
+
+def groupRuns(runs, keys=None):
+	"""
+	Maps configuration to the list of its runs.
+	"""
+	groups = {}
+	for run in runs:
+		groups.setdefault(configuration(run, keys), []).append(run)
+
+	return groups
+
+
+CHECKSUM_SPAN = 2**16
+
+
+def checksum(path, offset):
+	"""
+	Digest of the file head and of the bytes just before offset; if either changes, the file was rewritten, not appended to.
+	"""
+	import hashlib
+
+	digest = hashlib.sha1()
+	with open(path, "rb") as file:
+		digest.update(file.read(min(offset, CHECKSUM_SPAN)))
+		file.seek(max(0, offset - CHECKSUM_SPAN))
+		digest.update(file.read(min(offset, CHECKSUM_SPAN)))
+
+	return digest.hexdigest()
+
+
+class RunStore(object):
+	"""
+	SQLite store of parsed runs, fed incrementally from the logs' appended bytes.
+	"""
+
+	def __init__(self, path):
+		import sqlite3
+
+		self._connection = sqlite3.connect(path)
+		self._connection.executescript("""
+			CREATE TABLE IF NOT EXISTS logs (
+				path TEXT PRIMARY KEY,
+				offset INTEGER NOT NULL,
+				checksum TEXT NOT NULL
+			);
+			CREATE TABLE IF NOT EXISTS runs (
+				id INTEGER PRIMARY KEY,
+				file TEXT NOT NULL,
+				start REAL NOT NULL,
+				end REAL NOT NULL,
+				UNIQUE (file, start)
+			);
+			CREATE TABLE IF NOT EXISTS parameters (
+				run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+				name TEXT NOT NULL,
+				value TEXT NOT NULL,
+				PRIMARY KEY (run, name)
+			);
+			CREATE TABLE IF NOT EXISTS phases (
+				run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+				name TEXT NOT NULL,
+				start REAL NOT NULL,
+				end REAL NOT NULL
+			);
+			CREATE INDEX IF NOT EXISTS runsStart ON runs (start);
+			CREATE INDEX IF NOT EXISTS parametersValue ON parameters (name, value);
+			CREATE INDEX IF NOT EXISTS phasesRun ON phases (run);
+		""")
+		self._connection.execute("PRAGMA foreign_keys = ON")
+
+	def close(self):
+		self._connection.close()
+
+	def ingest(self, path):
+		"""
+		Parses only what was appended to path since the last ingestion and upserts the new runs. Returns the number of runs ingested.
+		"""
+		path = os.path.abspath(path)
+		row = self._connection.execute("SELECT offset, checksum FROM logs WHERE path = ?", (path, )).fetchone()
+
+		offset = 0
+		if row is not None:
+			if os.path.getsize(path) >= row[0] and checksum(path, row[0]) == row[1]:
+				offset = row[0]
+			else:
+				# rewritten, start over
+				self._connection.execute("DELETE FROM runs WHERE file = ?", (path, ))
+
+		count = 0
+		with self._connection:
+			for run in parseRuns(path, offset):
+				self._upsert(path, run)
+				offset = run["offset"]
+				count += 1
+
+			self._connection.execute("INSERT OR REPLACE INTO logs (path, offset, checksum) VALUES (?, ?, ?)", (path, offset, checksum(path, offset)))
+
+		return count
+
+	def _upsert(self, path, run):
+		self._connection.execute("DELETE FROM runs WHERE file = ? AND start = ?", (path, run["start"]))
+		cursor = self._connection.execute("INSERT INTO runs (file, start, end) VALUES (?, ?, ?)", (path, run["start"], run["end"]))
+		self._connection.executemany("INSERT INTO parameters (run, name, value) VALUES (?, ?, ?)", [(cursor.lastrowid, name, value) for name, value in run["parameters"].items()])
+		self._connection.executemany("INSERT INTO phases (run, name, start, end) VALUES (?, ?, ?, ?)", [(cursor.lastrowid, name, start, end) for name, start, end in run["phases"]])
+
+	def runs(self, parameters={}):
+		"""
+		Runs (as parseRuns dicts) whose parameters include all given name/value pairs.
+		"""
+		selection = "SELECT id FROM runs"
+		arguments = []
+		for name, value in parameters.items():
+			selection += f" {'WHERE' if len(arguments) == 0 else 'AND'} id IN (SELECT run FROM parameters WHERE name = ? AND value = ?)"
+			arguments += [name, str(value)]
+
+		runs = {}
+		for id, file, start, end in self._connection.execute(f"SELECT id, file, start, end FROM runs WHERE id IN ({selection})", arguments):
+			runs[id] = {"file": file, "start": start, "end": end, "parameters": {}, "phases": []}
+
+		for id, name, value in self._connection.execute(f"SELECT run, name, value FROM parameters WHERE run IN ({selection})", arguments):
+			runs[id]["parameters"][name] = value
+		for id, name, start, end in self._connection.execute(f"SELECT run, name, start, end FROM phases WHERE run IN ({selection}) ORDER BY start", arguments):
+			runs[id]["phases"] += [(name, start, end)]
+
+		return list(runs.values())
+
+	def hoursPerWeek(self):
+		return self._connection.execute("""
+			SELECT strftime('%Y-%W', start, 'unixepoch') AS week, SUM(end - start) / 3600.0, COUNT(*)
+			FROM runs GROUP BY week ORDER BY week
+		""").fetchall()
+
+	def hoursPerParameter(self, name):
+		return self._connection.execute("""
+			SELECT parameters.value, SUM(runs.end - runs.start) / 3600.0, COUNT(*)
+			FROM parameters JOIN runs ON runs.id = parameters.run
+			WHERE parameters.name = ? GROUP BY parameters.value ORDER BY 2 DESC
+		""", (name, )).fetchall()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import re
+import mmap
+import numpy as np
+from sweep import DEFAULTS, THREADS, parseAssignment, expandGrid, runJob
+
+# the parameters different-threads.sh runs with
+SCALING_DEFAULTS = dict(DEFAULTS, generateIndices=True, bucketsNumber=4096, epsilon=1, useGamma=True, useOramOptimization=True, levels=0, virtualRequests=False, fileLogging=True)
+
+LOG_PATH = re.compile(r"Log written to\s+(\S+)")
+# per-query trace lines, e.g. "Query 3 completed in 412 ms" or "query #3: 412.5 μs": a guess, bin/main is not known
+# to print such lines. Without matches every point is estimated and no latencies reach the store, so the latency
+# figures of plots.py need --query-time set to the format bin/main actually logs.
+QUERY_TIME = re.compile(rb"(?:TRACE|DEBUG|INFO):\s*[^\n]*?[Qq]uery[^\n]*?(\d+(?:\.\d+)?)\s*(ns|\xce\xbcs|us|ms|s)\b")
+UNITS = {b"ns": 1e-9, "μs".encode("utf-8"): 1e-6, b"us": 1e-6, b"ms": 1e-3, b"s": 1.0}
+
+
+def parse():
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Measure thread scaling of bin/main")
+
+	parser.add_argument("--threads", dest="threads", metavar="threads", type=int, nargs='+', default=list(range(1, 17)), help=f"Thread counts to run; the smallest one is the speedup baseline.")
+	parser.add_argument("--grid", dest="grid", metavar="name=v1,v2", type=parseAssignment, nargs='+', default=[], help=f"Other swept parameters, such as oramsNumber=32,64 useGamma=true,false.")
+	parser.add_argument("--set", dest="set", metavar="name=value", type=parseAssignment, nargs='+', default=[], help=f"Fixed parameters overriding the defaults.")
+	parser.add_argument("--input", dest="input", metavar="input", type=str, default="UNIFORM-1000000-10000", help=f"A portion of input file name, such as \"UNIFORM-100-1000000\" in \"dataset-UNIFORM-100-1000000.csv\".")
+	parser.add_argument("--repetitions", dest="repetitions", metavar="repetitions", type=int, default=3, help=f"Runs per point; the median is reported.")
+	parser.add_argument("--weak", dest="weak", default=False, help="Weak scaling: grow the number of queries with the thread count and fit Gustafson's law instead of Amdahl's", action="store_true")
+	parser.add_argument("--query-time", dest="queryTime", metavar="regex", type=str, default=None, help=f"Regular expression of bin/main's per-query log lines, capturing the time and its unit (ns, us, ms or s).")
+
+	parser.add_argument("--binary", dest="binary", metavar="binary", type=str, default="../../dp-oram/dp-oram/bin/main", help=f"The executable to run (bin/main or a local stub).")
+	parser.add_argument("--directory", dest="directory", metavar="directory", type=str, default=None, help=f"Working directory of runs (two levels above the binary by default).")
+	parser.add_argument("--no-pinning", dest="pinning", default=True, help="Do not pin runs to as many CPUs as they have threads", action="store_false")
+	parser.add_argument("--store", dest="store", metavar="store", type=str, default=None, help=f"SQLite results store to add every run and its per-query times to.")
+	parser.add_argument("--plot", dest="plot", metavar="plot", type=str, default=None, help=f"Write the speedup plot to this SVG file.")
+
+	parser.add_argument("-v", "--verbose", dest="verbose", default=False, help="increase output verbosity", action="store_true")
+
+	args = parser.parse_args()
+
+	logging.basicConfig(
+		level=logging.DEBUG if args.verbose else logging.INFO,
+		format='%(asctime)s %(levelname)-8s %(message)s',
+		datefmt='%a, %d %b %Y %H:%M:%S',
+	)
+
+	base = dict(SCALING_DEFAULTS, dataset=f"dataset-{args.input}", queryset=f"queries-{args.input}-0.5-follow")
+	base.update(dict(args.set))
+
+	queryTime = QUERY_TIME
+	if args.queryTime is not None:
+		queryTime = re.compile(args.queryTime.encode("utf-8"))
+		if queryTime.groups != 2:
+			parser.error("--query-time must capture the time and its unit")
+
+	binary = os.path.abspath(args.binary)
+	directory = os.path.abspath(args.directory) if args.directory is not None else os.path.dirname(os.path.dirname(binary))
+
+	return base, dict(args.grid), sorted(set(args.threads)), args.repetitions, args.weak, queryTime, binary, directory, args.pinning, args.plot, args.store
+
+
+def queryTimings(path, pattern=QUERY_TIME):
+	"""
+	Per-query times in seconds found in a bin/main log file, as a NumPy array (empty if the log has none).
+	"""
+	if not os.path.exists(path) or os.path.getsize(path) == 0:
+		return np.empty(0)
+
+	with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		return np.array([float(match.group(1)) * UNITS[match.group(2)] for match in pattern.finditer(data)])
+
+
+def measure(binary, directory, parameters, pinning, queryTime=QUERY_TIME):
+	"""
+	Runs one point and returns the result, per-query times and whether they are estimated.
+	Times come from the trace log if it has them, otherwise the run time, setup included, is spread over the queries.
+	"""
+	threads = int(parameters[THREADS])
+	cpus = set(sorted(os.sched_getaffinity(0))[:threads]) if pinning else None
+	result = runJob(binary, directory, parameters, cpus)
+	if result["returncode"] != 0:
+		raise RuntimeError(f"Execution failed for {parameters}: {result['stderr'].strip()[:200]}")
+
+	log = LOG_PATH.search(result["stdout"])
+	timings = queryTimings(os.path.join(directory, log.group(1)), queryTime) if log is not None else np.empty(0)
+	if len(timings) > 0:
+		return result, timings, False
+
+	queries = int(parameters.get("queries", 1))
+	logging.warning(f"No per-query times in the log of the {threads}-thread run; spreading the {result['duration']:.2f} s run, index generation included, over {queries} queries")
+	return result, np.full(queries, result["duration"] / queries), True
+
+
+def amdahl(threads, times):
+	"""
+	Least-squares fit of T(p) = T1 * (s + (1 - s) / p). Returns the serial fraction s, clamped to [0, 1], and T1.
+	"""
+	design = np.stack([np.ones(len(threads)), 1 / threads], axis=1)
+	(serial, parallel), *_ = np.linalg.lstsq(design, times, rcond=None)
+	fraction = serial / (serial + parallel)
+	if not 0.0 <= fraction <= 1.0:
+		logging.warning(f"Amdahl fit failed: serial fraction {fraction:.3f} is outside [0, 1], clamping it")
+	return float(np.clip(fraction, 0.0, 1.0)), float(serial + parallel)
+
+
+def gustafson(threads, speedups):
+	"""
+	Least-squares fit of the scaled speedup S(p) = p - a * (p - 1) of a weak-scaling run. Returns the serial fraction a, clamped to [0, 1].
+	"""
+	extra = threads - 1
+	if not np.any(extra):
+		return 0.0
+	fraction = np.sum((threads - speedups) * extra) / np.sum(extra * extra)
+	if not 0.0 <= fraction <= 1.0:
+		logging.warning(f"Gustafson fit failed: serial fraction {fraction:.3f} is outside [0, 1], clamping it")
+	return float(np.clip(fraction, 0.0, 1.0))
+
+
+def scaling(threads, times, weak=False):
+	"""
+	Speedup and parallel efficiency relative to the smallest thread count.
+	Under weak scaling the work grows with the threads and the speedup is the scaled one, p * T(p0) / T(p).
+	"""
+	speedups = times[0] / times * (threads if weak else threads[0])
+	return speedups, speedups / threads
+
+
+def plotScaling(curves, filename, weak=False):
+	from bokeh.models import Legend
+	from bokeh.plotting import figure
+	from bokeh.io import export_svgs
+	from bokeh.palettes import Category10
+
+	plot = figure(title="Scalability", x_axis_label="Threads", y_axis_label="Scaled speedup" if weak else "Speedup")
+	plot.xaxis.axis_label_text_font = "normal"
+	plot.yaxis.axis_label_text_font = "normal"
+	plot.title.align = "center"
+
+	ideal = max(max(threads) for _, threads, _ in curves)
+	items = [("Ideal", [plot.line([1, ideal], [1, ideal], line_dash="dashed", color="gray")])]
+	for (label, threads, speedups), color in zip(curves, Category10[10] * (len(curves) // 10 + 1)):
+		items += [(label, [plot.line(threads, speedups, line_width=2, color=color), plot.circle(threads, speedups, size=3, color=color)])]
+
+	plot.add_layout(Legend(items=items))
+	plot.output_backend = "svg"
+	export_svgs(plot, filename=filename)
+
+
+def main():
+
+	base, grid, threads, repetitions, weak, queryTime, binary, directory, pinning, plot, store = parse()
+
+	if store is not None:
+		from results import ResultStore
+		store = ResultStore(store)
+
+	configurations = expandGrid(base, grid)
+	logging.info(f"Running {len(configurations)} configurations x {len(threads)} thread counts x {repetitions} repetitions of {binary}")
+
+	print(f"{'configuration':<40}{'threads':>8}{'median, ms':>12}{'p90, ms':>12}{'speedup':>10}{'efficiency':>12}")
+	curves = []
+	estimates = False
+	for configuration in configurations:
+		label = ", ".join(f"{name}={configuration[name]}" for name in grid) or "default"
+
+		medians = []
+		p90s = []
+		durations = []
+		marks = []
+		for count in threads:
+			parameters = dict(configuration, **{THREADS: count})
+			if weak:
+				parameters["queries"] = int(configuration.get("queries", 1)) * count // threads[0]
+
+			timings = []
+			runDurations = []
+			estimated = False
+			for _ in range(repetitions):
+				result, runTimings, runEstimated = measure(binary, directory, parameters, pinning, queryTime)
+				timings += [runTimings]
+				runDurations += [result["duration"]]
+				estimated |= runEstimated
+				if store is not None:
+					# spread run times are not query latencies
+					store.add(result, source="scaling", latencies=None if runEstimated else runTimings)
+			timings = np.concatenate(timings)
+			medians += [np.median(timings)]
+			p90s += [np.percentile(timings, 90)]
+			durations += [np.median(runDurations)]
+			marks += ["*" if estimated else ""]
+			logging.debug(f"{label}, {count} threads: {len(timings)} query times, median {medians[-1] * 1000:.1f} ms")
+
+		counts = np.array(threads, dtype=np.float64)
+		medians = np.array(medians)
+		# the per-query time stays put as queries are added, so weak scaling compares whole runs
+		speedups, efficiencies = scaling(counts, np.array(durations) if weak else medians, weak)
+		for count, median, p90, speedup, efficiency, mark in zip(threads, medians, p90s, speedups, efficiencies, marks):
+			print(f"{label[:39]:<40}{count:>8}{median * 1000:>12.1f}{p90 * 1000:>12.1f}{speedup:>10.2f}{efficiency:>12.2f}{mark}")
+
+		if weak:
+			print(f"{label[:39]:<40} Gustafson serial fraction {gustafson(counts, speedups):.3f}")
+		else:
+			serial, single = amdahl(counts, medians)
+			print(f"{label[:39]:<40} Amdahl serial fraction {serial:.3f} (max speedup {1 / serial if serial > 0 else float('inf'):.1f})")
+		print()
+
+		curves += [(label, threads, speedups)]
+		estimates |= any(marks)
+
+	if estimates:
+		print("* estimated: the log has no per-query times, so the run time, index generation included, is spread over the queries")
+
+	if store is not None:
+		store.close()
+	if plot is not None:
+		plotScaling(curves, plot, weak)
+
+
+if __name__ == "__main__":
+	main()
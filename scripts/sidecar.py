@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""
+Sidecar index written next to a generated dataset (dataset-X.csv -> dataset-X.index/).
+
+boundaries.npy	buckets + 1 equal-width bucket boundaries over [min, max]
+counts.npy	number of records strictly below each boundary (the last one counts all records)
+quantiles.npy	values at probabilities 0, 1/q, ..., 1
+answers-*.npy	exact answer sizes of a generated queryset, in file order
+meta.json	size, min, max, number of buckets and quantiles
+
+Arrays are plain .npy files, so readers map them with mmap instead of reading the dataset.
+"""
+
+import numpy as np
+import json
+import os
+import logging
+
+QUANTILES = 1000
+
+
+def stripCsv(path):
+	# not os.path.splitext, names like queries-X-0.5-follow have dots of their own
+	return path[:-len(".csv")] if path.endswith(".csv") else path
+
+
+def sidecarPath(datasetPath):
+	return f"{stripCsv(datasetPath)}.index"
+
+
+def answerSizes(index, queries):
+	"""
+	Exact sizes of [left, right] answers over a sorted index; queries is an (n, 2) array.
+	"""
+	queries = np.asarray(queries)
+	return np.searchsorted(index, queries[:, 1], side="right") - np.searchsorted(index, queries[:, 0], side="left")
+
+
+def writeSidecar(datasetPath, index, buckets, scale=1, answers={}):
+	"""
+	index is the sorted dataset in storage units; boundaries and quantiles are written in output units (divided by scale).
+	answers maps a queryset name (e.g. queries-X-0.5-follow) to its answer sizes.
+	"""
+	path = sidecarPath(datasetPath)
+	os.makedirs(path, exist_ok=True)
+
+	boundaries = np.linspace(index[0], index[-1], buckets + 1)
+	counts = np.searchsorted(index, boundaries, side="left")
+	counts[-1] = len(index)
+
+	quantiles = index[np.minimum((np.linspace(0, 1, QUANTILES + 1) * len(index)).astype(np.int64), len(index) - 1)]
+
+	np.save(f"{path}/boundaries.npy", boundaries / scale)
+	np.save(f"{path}/counts.npy", counts)
+	np.save(f"{path}/quantiles.npy", quantiles / scale)
+	for name, sizes in answers.items():
+		np.save(f"{path}/answers-{name}.npy", np.asarray(sizes, dtype=np.int64))
+
+	with open(f"{path}/meta.json", "w") as out:
+		json.dump({
+			"size": len(index),
+			"min": index[0] / scale,
+			"max": index[-1] / scale,
+			"buckets": buckets,
+			"quantiles": QUANTILES,
+		}, out)
+
+	logging.debug(f"Sidecar index written to {path}")
+
+
+class Sidecar(object):
+	def __init__(self, datasetPath):
+		path = sidecarPath(datasetPath)
+		self._path = path
+
+		with open(f"{path}/meta.json") as meta:
+			self.meta = json.load(meta)
+
+		self.boundaries = np.load(f"{path}/boundaries.npy", mmap_mode="r")
+		self.counts = np.load(f"{path}/counts.npy", mmap_mode="r")
+		self.quantiles = np.load(f"{path}/quantiles.npy", mmap_mode="r")
+
+	def buckets(self, left, right):
+		"""
+		First and last (inclusive) bucket touched by [left, right]; scalars or arrays.
+		"""
+		last = len(self.boundaries) - 2
+		first = np.clip(np.searchsorted(self.boundaries, left, side="right") - 1, 0, last)
+		final = np.clip(np.searchsorted(self.boundaries, right, side="right") - 1, 0, last)
+		return first, final
+
+	def countBounds(self, left, right):
+		"""
+		Lower and upper bounds on the number of records in [left, right]: buckets fully inside versus all touched buckets.
+		"""
+		first, last = self.buckets(left, right)
+		upper = self.counts[last + 1] - self.counts[first]
+
+		# a range reaching past the data covers the edge buckets whole
+		left = np.maximum(left, self.boundaries[0])
+		right = np.minimum(right, self.boundaries[-1])
+		# the buckets from the first boundary at or after left to the last one at or before right
+		start = np.minimum(np.searchsorted(self.boundaries, left, side="left"), len(self.boundaries) - 1)
+		end = np.maximum(np.searchsorted(self.boundaries, right, side="right") - 1, 0)
+		lower = np.where(end > start, self.counts[end] - self.counts[start], 0)
+		return lower, upper
+
+	def count(self, left, right):
+		"""
+		Estimated number of records in [left, right], interpolating linearly inside the two boundary buckets.
+		"""
+		return np.maximum(np.interp(right, self.boundaries, self.counts) - np.interp(left, self.boundaries, self.counts), 0)
+
+	def quantile(self, probability):
+		return np.interp(probability, np.linspace(0, 1, len(self.quantiles)), self.quantiles)
+
+	def answers(self, queryset):
+		"""
+		Exact answer sizes of a generated queryset, given by name or by path.
+		"""
+		name = stripCsv(os.path.basename(queryset))
+		return np.load(f"{self._path}/answers-{name}.npy", mmap_mode="r")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed cache of the storage files bin/main generates (dp-oram/storage-files).
+
+Entries live in <cache>/<hash>/, where the hash covers only the parameters that change the files,
+so sweeps over query-side parameters (epsilon, beta, gamma) reuse one entry. Files are put in place
+by reflink (falling back to a copy) or by hard link, and least recently used entries are evicted
+once the cache exceeds its disk budget.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import subprocess
+
+# the parameters bin/main's storage files depend on; sweep.py groups its runs by them (see SHARED)
+STORAGE_PARAMETERS = ["dataset", "oramsNumber", "bucketsNumber", "recordSize", "count", "seed", "readInputs", "oramStorage"]
+
+
+def storageKey(parameters):
+	# values are compared as strings, as sweep.sharedKey does, so that a SHARED group never spans two keys
+	return hashlib.sha256(json.dumps({name: str(parameters.get(name)) for name in STORAGE_PARAMETERS}, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def place(source, target, method):
+	if method == "hardlink":
+		try:
+			os.link(source, target)
+			return
+		except OSError:
+			pass
+	elif method == "reflink":
+		if subprocess.run(["cp", "--reflink=auto", source, target], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
+			return
+	shutil.copy2(source, target)
+
+
+def directorySize(path):
+	return sum(os.stat(f"{path}/{name}").st_size for name in os.listdir(path))
+
+
+def clearDirectory(path):
+	os.makedirs(path, exist_ok=True)
+	for name in os.listdir(path):
+		if os.path.isfile(f"{path}/{name}") or os.path.islink(f"{path}/{name}"):
+			os.remove(f"{path}/{name}")
+
+
+class StorageCache(object):
+	def __init__(self, directory, budget, method="reflink"):
+		"""
+		budget is in bytes; method is reflink, hardlink (only safe if bin/main never writes storage files in place) or copy.
+		"""
+		self._directory = directory
+		self._budget = budget
+		self._method = method
+		os.makedirs(directory, exist_ok=True)
+
+	def _entry(self, parameters):
+		return f"{self._directory}/{storageKey(parameters)}"
+
+	def has(self, parameters):
+		return os.path.isdir(self._entry(parameters))
+
+	def restore(self, parameters, target):
+		"""
+		Replaces the files in target with the cached ones. Returns False on a cache miss (target is left untouched).
+		"""
+		entry = self._entry(parameters)
+		if not os.path.isdir(entry):
+			return False
+
+		clearDirectory(target)
+		for name in os.listdir(entry):
+			place(f"{entry}/{name}", f"{target}/{name}", self._method)
+
+		# the entry's mtime is its last use
+		os.utime(entry)
+		logging.debug(f"Restored storage {os.path.basename(entry)[:12]} into {target}")
+		return True
+
+	def store(self, parameters, source):
+		"""
+		Caches the files in source for the parameters, then evicts least recently used entries over the budget.
+		"""
+		entry = self._entry(parameters)
+		if os.path.isdir(entry) or not os.path.isdir(source) or len(os.listdir(source)) == 0:
+			return
+
+		staging = f"{entry}.{os.getpid()}.tmp"
+		os.makedirs(staging, exist_ok=True)
+		for name in os.listdir(source):
+			if os.path.isfile(f"{source}/{name}"):
+				place(f"{source}/{name}", f"{staging}/{name}", self._method)
+		os.replace(staging, entry)
+
+		logging.debug(f"Stored storage {os.path.basename(entry)[:12]} ({directorySize(entry)} bytes)")
+		self.evict(keep=entry)
+
+	def evict(self, keep=None):
+		entries = [f"{self._directory}/{name}" for name in os.listdir(self._directory) if not name.endswith(".tmp")]
+		sizes = {entry: directorySize(entry) for entry in entries}
+		total = sum(sizes.values())
+
+		for entry in sorted(entries, key=lambda entry: os.stat(entry).st_mtime):
+			if total <= self._budget:
+				break
+			if entry == keep:
+				continue
+			shutil.rmtree(entry)
+			total -= sizes[entry]
+			logging.debug(f"Evicted storage {os.path.basename(entry)[:12]} ({sizes[entry]} bytes)")
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+
+"""
+In-process SVG renderer for the chart types of plots.py (bar, double bar, line and grouped log bar charts, and the
+latency CDF, percentile band and time series charts), styled after the Bokeh figures so the paper plots no longer need a browser to be serialized.
+"""
+
+import math
+from xml.sax.saxutils import escape
+
+font = "libertine"
+label_font = "helvetica"
+tick_font_size = 11
+axis_label_font_size = 13
+grid_color = "#e5e5e5"
+axis_color = "#444444"
+
+superscripts = "⁰¹²³⁴⁵⁶⁷⁸⁹"
+
+
+def hex_color(color):
+	return color if isinstance(color, str) else "#%02x%02x%02x" % tuple(color)
+
+
+def text_width(text, size):
+	# no font metrics without a browser; the average Latin glyph is about half an em wide
+	return len(str(text)) * size * 0.55
+
+
+def format_tick(value):
+	if value == int(value):
+		return f"{int(value)}"
+	return f"{value:g}"
+
+
+def power_label(value):
+	exponent = int(round(math.log10(value)))
+	return "10" + "".join("⁻" if digit == "-" else superscripts[int(digit)] for digit in str(exponent))
+
+
+def linear_ticks(low, high, desired=6):
+	"""
+	Round tick values within [low, high], about desired of them.
+	"""
+	span = max(high - low, 1e-12)
+	step = 10 ** math.floor(math.log10(span / desired))
+	for multiplier in [1, 2, 2.5, 5, 10]:
+		if span / (step * multiplier) <= desired:
+			step *= multiplier
+			break
+
+	first = math.ceil(low / step) * step
+	return [first + i * step for i in range(int((high - first) / step + 1e-9) + 1)]
+
+
+def log_ticks(low, high):
+	return [10 ** exponent for exponent in range(math.ceil(math.log10(low)), math.floor(math.log10(high)) + 1)]
+
+
+class Canvas(object):
+	"""
+	Accumulates SVG elements of a width by height figure.
+	"""
+
+	def __init__(self, width, height):
+		self.width = width
+		self.height = height
+		self._elements = []
+
+	def rect(self, x, y, width, height, fill, alpha=1.0):
+		self._elements += [f'<rect x="{x:.2f}" y="{y:.2f}" width="{max(width, 0):.2f}" height="{max(height, 0):.2f}" fill="{fill}" fill-opacity="{alpha}"/>']
+
+	def line(self, x1, y1, x2, y2, stroke, width=1, dash=None):
+		dasharray = f' stroke-dasharray="{dash}"' if dash else ""
+		self._elements += [f'<line x1="{x1:.2f}" y1="{y1:.2f}" x2="{x2:.2f}" y2="{y2:.2f}" stroke="{stroke}" stroke-width="{width}"{dasharray}/>']
+
+	def polyline(self, points, stroke, width=1):
+		coordinates = " ".join(f"{x:.2f},{y:.2f}" for x, y in points)
+		self._elements += [f'<polyline points="{coordinates}" fill="none" stroke="{stroke}" stroke-width="{width}" stroke-linejoin="round"/>']
+
+	def polygon(self, points, fill, alpha=1.0):
+		coordinates = " ".join(f"{x:.2f},{y:.2f}" for x, y in points)
+		self._elements += [f'<polygon points="{coordinates}" fill="{fill}" fill-opacity="{alpha}" stroke="none"/>']
+
+	def circle(self, x, y, radius, fill):
+		self._elements += [f'<circle cx="{x:.2f}" cy="{y:.2f}" r="{radius}" fill="{fill}" stroke="{fill}"/>']
+
+	def text(self, x, y, text, size, anchor="start", baseline="alphabetic", family=font, color="#000000", rotate=None, style=None):
+		transform = f' transform="rotate({rotate:.2f} {x:.2f} {y:.2f})"' if rotate else ""
+		font_style = f' font-style="{style}"' if style else ""
+		self._elements += [
+			f'<text x="{x:.2f}" y="{y:.2f}" font-family="{family}" font-size="{size}px" fill="{color}" text-anchor="{anchor}" dominant-baseline="{baseline}"{font_style}{transform}>{escape(str(text))}</text>'
+		]
+
+	def svg(self):
+		return "\n".join([
+			f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{self.width}" height="{self.height}" viewBox="0 0 {self.width} {self.height}">',
+			f'<rect width="{self.width}" height="{self.height}" fill="#ffffff"/>',
+			*self._elements,
+			"</svg>",
+		])
+
+	def save(self, filename):
+		with open(filename, "w") as file:
+			file.write(self.svg())
+
+
+class Frame(object):
+	"""
+	The data area of a figure: maps data coordinates to pixels and draws the grid and axes around it.
+	"""
+
+	def __init__(self, canvas, y_low, y_high, y_log=False, y_label=None, bottom=30, left=None, categories=None, x_low=0.0, x_high=1.0, x_log=False, x_label=None):
+		self.canvas = canvas
+		self.y_low = y_low
+		self.y_high = y_high
+		self.y_log = y_log
+		self.categories = categories
+		self.x_low = x_low
+		self.x_high = x_high
+		self.x_log = x_log
+		self.x_label = x_label
+
+		self.y_ticks = log_ticks(y_low, y_high) if y_log else linear_ticks(y_low, y_high)
+		self.y_tick_labels = [power_label(tick) if y_log else format_tick(tick) for tick in self.y_ticks]
+
+		widest = max([text_width(label, tick_font_size) for label in self.y_tick_labels] + [0])
+		self.left = left if left is not None else 10 + (axis_label_font_size + 10 if y_label else 0) + widest + 8
+		self.right = canvas.width - 10
+		self.top = 10
+		self.bottom = canvas.height - bottom - (axis_label_font_size + 6 if x_label else 0)
+		self.y_label = y_label
+
+	def y(self, value):
+		if self.y_log:
+			value = math.log10(max(value, 1e-300))
+			low, high = math.log10(self.y_low), math.log10(self.y_high)
+		else:
+			low, high = self.y_low, self.y_high
+		value = min(max(value, low), high)
+		return self.bottom - (value - low) / (high - low) * (self.bottom - self.top)
+
+	def x(self, value):
+		if self.x_log:
+			value = math.log10(max(value, 1e-300))
+			low, high = math.log10(self.x_low), math.log10(self.x_high)
+		else:
+			low, high = self.x_low, self.x_high
+		return self.left + (value - low) / (high - low) * (self.right - self.left)
+
+	def x_ticks(self):
+		"""
+		Ticks within the x range and their labels, for numeric x axes.
+		"""
+		if self.x_log:
+			ticks = log_ticks(self.x_low, self.x_high)
+			if len(ticks) >= 3:
+				return ticks, [power_label(tick) for tick in ticks]
+			# within a couple of decades, 1-2-5 steps read better than lone powers of ten
+			ticks = [tick * multiplier for tick in log_ticks(self.x_low / 10, self.x_high) for multiplier in [1, 2, 5] if self.x_low <= tick * multiplier <= self.x_high]
+			return ticks, [format_tick(tick) for tick in ticks]
+		ticks = [tick for tick in linear_ticks(self.x_low, self.x_high) if self.x_low <= tick <= self.x_high]
+		return ticks, [format_tick(round(tick, 10)) for tick in ticks]
+
+	def category(self, index, offset=0.0):
+		"""
+		Pixel center of the category at index, shifted by offset in category widths.
+		"""
+		return self.x(index + 0.5 + offset)
+
+	def draw_grid(self, x_ticks=None):
+		for tick in self.y_ticks:
+			self.canvas.line(self.left, self.y(tick), self.right, self.y(tick), grid_color)
+		for tick in x_ticks or []:
+			self.canvas.line(self.x(tick), self.top, self.x(tick), self.bottom, grid_color)
+
+	def draw_axes(self, x_ticks=None, x_tick_labels=None, x_label_rotation=None):
+		canvas = self.canvas
+
+		canvas.line(self.left, self.bottom, self.right, self.bottom, axis_color)
+		canvas.line(self.left, self.top, self.left, self.bottom, axis_color)
+
+		for tick, label in zip(self.y_ticks, self.y_tick_labels):
+			canvas.line(self.left - 6, self.y(tick), self.left, self.y(tick), axis_color)
+			canvas.text(self.left - 8, self.y(tick), label, tick_font_size, anchor="end", baseline="middle", color=axis_color)
+
+		if self.categories is not None:
+			for index, label in enumerate(self.categories):
+				self.draw_x_label(self.category(index), label, x_label_rotation)
+		else:
+			for tick, label in zip(x_ticks or [], x_tick_labels or []):
+				canvas.line(self.x(tick), self.bottom, self.x(tick), self.bottom + 6, axis_color)
+				self.draw_x_label(self.x(tick), label, x_label_rotation)
+
+		if self.x_label:
+			canvas.text((self.left + self.right) / 2, canvas.height - 6, self.x_label, axis_label_font_size, anchor="middle", family=label_font, color=axis_color, style="italic")
+
+		if self.y_label:
+			middle = (self.top + self.bottom) / 2
+			canvas.text(10 + axis_label_font_size, middle, self.y_label, axis_label_font_size, anchor="middle", family=label_font, color=axis_color, rotate=-90, style="italic")
+
+	def draw_x_label(self, x, label, rotation=None):
+		if rotation:
+			self.canvas.text(x, self.bottom + 8, label, tick_font_size, anchor="end", baseline="middle", color=axis_color, rotate=-math.degrees(rotation))
+		else:
+			self.canvas.text(x, self.bottom + 8, label, tick_font_size, anchor="middle", baseline="hanging", color=axis_color)
+
+
+def draw_legend(canvas, items, x, y, size=8, orientation="vertical", anchor="start"):
+	"""
+	items are (label, color) pairs; x, y is the top-left corner (top-center for anchor "middle").
+	"""
+	widths = [text_width(label, size * 4 / 3) + 30 for label, _ in items]
+	if anchor == "middle":
+		x -= (sum(widths) if orientation == "horizontal" else max(widths + [0])) / 2
+
+	for (label, color), width in zip(items, widths):
+		canvas.rect(x + 4, y + 6, 16, size, color, 0.8)
+		canvas.text(x + 26, y + 6 + size / 2, label, f"{size * 4 / 3:.2f}", baseline="middle", family=font)
+		if orientation == "horizontal":
+			x += width
+		else:
+			y += size * 2
+
+
+def barchart(bins, values, colors, labels, width, height, y_range, y_log=False, y_label=None, label_size=8):
+	"""
+	One bar per bin, labeled with its value, as make_barchart draws it.
+	"""
+	canvas = Canvas(width, height)
+	frame = Frame(canvas, y_range[0], y_range[1], y_log=y_log, y_label=y_label, categories=bins, x_low=0, x_high=len(bins))
+	frame.draw_grid()
+
+	for index, (value, color, label) in enumerate(zip(values, colors, labels)):
+		left = frame.category(index, -0.4)
+		canvas.rect(left, frame.y(value), frame.category(index, 0.4) - left, frame.bottom - frame.y(value), hex_color(color), 0.8)
+		canvas.text(frame.category(index) - 10, frame.y(value) - 5, label, f"{label_size * 4 / 3:.2f}", family=label_font)
+
+	frame.draw_axes()
+	return canvas
+
+
+def barchart_double(bins, values1, values2, colors1, colors2, width, height, y_label=None):
+	"""
+	Two dodged bars per bin with a horizontal legend on top, as make_barchart_double draws them.
+	"""
+	high = max(max(values1["data"]), max(values2["data"])) * 1.4
+	canvas = Canvas(width, height)
+	# Bokeh's range_padding 0.1 widens the category range by 5% on each side
+	padding = len(bins) * 0.05
+	frame = Frame(canvas, 0, high, y_label=y_label, categories=bins, x_low=-padding, x_high=len(bins) + padding)
+	frame.draw_grid()
+
+	for index in range(len(bins)):
+		for values, colors, offset, label_offset in [(values1, colors1, -0.2, -30), (values2, colors2, 0.2, 5)]:
+			value = values["data"][index]
+			left = frame.category(index, offset - 0.2)
+			canvas.rect(left, frame.y(value), frame.category(index, offset + 0.2) - left, frame.bottom - frame.y(value), hex_color(colors[index]), 0.8)
+			canvas.text(frame.category(index) + label_offset, frame.y(value) - 5, value, f"{7 * 4 / 3:.2f}", family=label_font)
+
+	frame.draw_axes()
+	draw_legend(canvas, [(values1["title"], hex_color(colors1[0])), (values2["title"], hex_color(colors2[0]))], (frame.left + frame.right) / 2, frame.top, orientation="horizontal", anchor="middle")
+	return canvas
+
+
+def line_chart(series, width, height, y_label=None, line_width=2, circle_size=3):
+	"""
+	series are (label, xs, ys, color) drawn as lines with circle markers and a legend in the top right, as epsilons_plot draws them.
+	"""
+	xs = [float(x) for _, values, _, _ in series for x in values]
+	ys = [float(y) for _, _, values, _ in series for y in values]
+	x_pad = (max(xs) - min(xs)) * 0.05
+	y_pad = (max(ys) - min(ys)) * 0.05
+
+	canvas = Canvas(width, height)
+	frame = Frame(canvas, min(ys) - y_pad, max(ys) + y_pad, y_label=y_label, x_low=min(xs) - x_pad, x_high=max(xs) + x_pad)
+	x_ticks, x_tick_labels = frame.x_ticks()
+	frame.draw_grid(x_ticks)
+
+	for _, values_x, values_y, color in series:
+		points = [(frame.x(float(x)), frame.y(float(y))) for x, y in zip(values_x, values_y)]
+		canvas.polyline(points, hex_color(color), line_width)
+		for x, y in points:
+			canvas.circle(x, y, circle_size / 2, hex_color(color))
+
+	frame.draw_axes(x_ticks, x_tick_labels)
+
+	labels = [(label, hex_color(color)) for label, _, _, color in series]
+	legend_width = max(text_width(label, 8 * 4 / 3) + 30 for label, _ in labels)
+	draw_legend(canvas, labels, frame.right - legend_width - 4, frame.top + 4)
+	return canvas
+
+
+def grouped_log_barchart(factors, values, group_colors, labels, width, height, y_range, y_label=None, rotation=1):
+	"""
+	Bars over (group, factor) pairs on a log axis with group names under rotated factor labels, as plot_strawman draws them.
+	"""
+	groups = list(dict.fromkeys(group for group, _ in factors))
+
+	# Bokeh's FactorRange leaves group padding of half a factor between groups
+	positions = []
+	position = 0.0
+	for index, (group, _) in enumerate(factors):
+		if index > 0 and factors[index - 1][0] != group:
+			position += 0.5
+		positions += [position]
+		position += 1
+
+	canvas = Canvas(width, height)
+	frame = Frame(canvas, y_range[0], y_range[1], y_log=True, y_label=y_label, bottom=60, x_low=0, x_high=position)
+	frame.draw_grid()
+
+	for (group, _), value, label, start in zip(factors, values, labels, positions):
+		color = hex_color(group_colors[groups.index(group)])
+		left = frame.x(start + 0.05)
+		canvas.rect(left, frame.y(value), frame.x(start + 0.95) - left, frame.bottom - frame.y(value), color, 0.8)
+		canvas.text(frame.x(start + 0.5) - 10, frame.y(value) - 5, label, f"{8 * 4 / 3:.2f}", family=label_font)
+
+	frame.draw_axes()
+	for (_, factor), start in zip(factors, positions):
+		frame.draw_x_label(frame.x(start + 0.5), factor, rotation)
+	for group in groups:
+		members = [start for (name, _), start in zip(factors, positions) if name == group]
+		canvas.text(frame.x((members[0] + members[-1] + 1) / 2), frame.bottom + 45, group, tick_font_size, anchor="middle", color=axis_color)
+
+	return canvas
+
+
+def cdf_chart(series, width, height, x_label=None, y_label=None, line_width=2):
+	"""
+	series are (label, latencies, fractions, color) drawn as lines on a log latency axis with a legend in the bottom right.
+	Empty series keep their legend entry.
+	"""
+	xs = [x for _, values, _, _ in series for x in values if x > 0] or [1]
+
+	canvas = Canvas(width, height)
+	frame = Frame(canvas, 0, 1, y_label=y_label, x_low=min(xs), x_high=max(xs) if max(xs) > min(xs) else min(xs) * 10, x_log=True, x_label=x_label)
+	x_ticks, x_tick_labels = frame.x_ticks()
+	frame.draw_grid(x_ticks)
+
+	for _, values_x, values_y, color in series:
+		canvas.polyline([(frame.x(x), frame.y(y)) for x, y in zip(values_x, values_y) if x > 0], hex_color(color), line_width)
+
+	frame.draw_axes(x_ticks, x_tick_labels)
+
+	labels = [(label, hex_color(color)) for label, _, _, color in series]
+	legend_width = max(text_width(label, 8 * 4 / 3) + 30 for label, _ in labels)
+	draw_legend(canvas, labels, frame.right - legend_width - 4, frame.bottom - len(labels) * 16 - 8)
+	return canvas
+
+
+def band_chart(xs, percentiles, levels, color, width, height, x_label=None, y_label=None, line_width=2, circle_size=3):
+	"""
+	Percentile bands over numeric xs: percentiles has a row of ascending percentile values per x, levels their names.
+	Symmetric pairs (outermost first) are shaded areas, darker inwards, and the middle percentile is a line with markers.
+	"""
+	count = len(levels)
+	ys = [y for row in percentiles for y in row]
+	x_pad = (max(xs) - min(xs)) * 0.05 or 1
+	y_pad = (max(ys) - min(ys)) * 0.05 or 1
+
+	canvas = Canvas(width, height)
+	frame = Frame(canvas, max(0, min(ys) - y_pad), max(ys) + y_pad, y_label=y_label, x_low=min(xs) - x_pad, x_high=max(xs) + x_pad, x_label=x_label)
+	x_ticks, x_tick_labels = frame.x_ticks()
+	frame.draw_grid(x_ticks)
+
+	legend = []
+	for i in range(count // 2):
+		alpha = 0.2 + 0.25 * i
+		lower = [(frame.x(x), frame.y(row[i])) for x, row in zip(xs, percentiles)]
+		upper = [(frame.x(x), frame.y(row[count - 1 - i])) for x, row in zip(xs, percentiles)]
+		canvas.polygon(lower + upper[::-1], hex_color(color), alpha)
+		legend += [(f"{levels[i]}–{levels[count - 1 - i]}", hex_color(color))]
+
+	if count % 2 == 1:
+		points = [(frame.x(x), frame.y(row[count // 2])) for x, row in zip(xs, percentiles)]
+		canvas.polyline(points, hex_color(color), line_width)
+		for x, y in points:
+			canvas.circle(x, y, circle_size / 2, hex_color(color))
+		legend += [(levels[count // 2], hex_color(color))]
+
+	frame.draw_axes(x_ticks, x_tick_labels)
+	draw_legend(canvas, legend, frame.left + 4, frame.top + 4)
+	return canvas
+
+
+def time_series_chart(times, values, color, width, height, x_label=None, y_label=None, y_log=False, line_width=1):
+	"""
+	One line through already decimated points, without markers.
+	"""
+	low, high = min(values), max(values)
+	if y_log:
+		y_range = (10 ** math.floor(math.log10(low)), 10 ** math.ceil(math.log10(high)))
+	else:
+		y_range = (0, high * 1.05 or 1)
+
+	canvas = Canvas(width, height)
+	frame = Frame(canvas, y_range[0], y_range[1], y_log=y_log, y_label=y_label, x_low=min(times), x_high=max(times) if max(times) > min(times) else min(times) + 1, x_label=x_label)
+	x_ticks, x_tick_labels = frame.x_ticks()
+	frame.draw_grid(x_ticks)
+
+	canvas.polyline([(frame.x(x), frame.y(y)) for x, y in zip(times, values)], hex_color(color), line_width)
+
+	frame.draw_axes(x_ticks, x_tick_labels)
+	return canvas
@@ -25,6 +25,12 @@ import sys, re, os
 import base64
 from optparse import OptionParser
 
+try:
+    basestring
+except NameError:
+    # Python 3, as used by plots.py
+    basestring = str
+
 VERSION = '0.0.1' # keep in sync with setup.py
 
 UNITS = ['pt','px','in','mm','cm']
@@ -158,13 +164,16 @@ class Document(object):
             raise ValueError('No layout, cannot save.')
         accum = LayoutAccumulator(**kwargs)
         self._layout.render(accum,debug_boxes=debug_boxes)
-        if isinstance(fileobj,file):
+        if hasattr(fileobj,'write'):
             fd = fileobj
             close = False
         else:
             fd = open(fileobj,mode='w')
             close = True
         buf = accum.tostring(pretty_print=True)
+        if not isinstance(buf,str):
+            # bytes on Python 3, where fd is a text file
+            buf = buf.decode('utf-8')
 
         fd.write(header_str)
         fd.write( buf )
@@ -185,6 +194,7 @@ class SVGFileBase(object):
         self._orig_width_px = self._width_px
         self._orig_height_px = self._height_px
         self._coord = None # unassigned
+        self._parent = None # enclosing layout, set by addSVG
 
     def get_root(self):
         return self._root
@@ -193,8 +203,12 @@ class SVGFileBase(object):
         return Size(self._width_px,self._height_px)
 
     def _set_size(self,size):
+        changed = (size.width, size.height) != (self._width_px, self._height_px)
         self._width_px = size.width
         self._height_px = size.height
+        if changed and self._parent is not None:
+            # the layouts around this file measured its old size
+            self._parent._invalidate()
 
     def _set_coord(self,coord):
         self._coord = coord
@@ -254,7 +268,7 @@ class LayoutAccumulator(object):
                  }
         for svgfile in self._svgfiles:
             origelem = svgfile.get_root()
-            for key,value in origelem.nsmap.iteritems():
+            for key,value in origelem.nsmap.items():
                 if key in NSMAP:
                     assert value == NSMAP[key]
                     # Already in namespace dictionary
@@ -391,15 +405,29 @@ class BoxLayout(Layout):
         self._spacing = 0 # between items in box
         self._coord = (0,0) # default
         self._size = None # uncalculated
+        self._parent = None # enclosing layout, set by addLayout
+        self._measured = {} # (min width, min height) -> (size, plan)
+        self._version = 0 # bumped whenever a measurement may be stale
 
     def _set_coord(self,coord):
         self._coord = coord
 
+    def _invalidate(self):
+        """forget the measurements of this layout and of its ancestors"""
+        layout = self
+        while layout is not None:
+            layout._measured = {}
+            layout._version += 1
+            layout = layout._parent
+
     def render(self,accum, min_size=None, level=0, debug_boxes=0):
-        size = self.get_size(min_size=min_size)
+        # measurements are memoized, so nested layouts get their size
+        # for the box they were placed in without laying out again
+        size, plan = self._measure(min_size)
         if level==0:
             # set document size if top level
             accum._set_size(size)
+        self._arrange(plan)
         if debug_boxes>0:
             # draw black line around BoxLayout element
             debug_box = etree.Element('{http://www.w3.org/2000/svg}rect')
@@ -457,11 +485,32 @@ class BoxLayout(Layout):
                 accum.add_raw_element(extra)
 
     def get_size(self, min_size=None, box_align=0, level=0 ):
-        cum_dim = 0 # size along layout direction
-        max_orth_dim = 0 # size along other direction
-
+        return self._measure(min_size)[0]
+
+    def _measure(self, min_size=None):
+        """size of the layout given min_size, and the box of each item
+
+        Measurements are memoized per min_size. Measuring resizes the
+        files that expand into their box, which changes what the layouts
+        around them measure, so a measurement is kept only if it left the
+        subtree unchanged, and resized files invalidate their ancestors.
+        Repeated measurements then cost nothing and the result is the
+        same as measuring again every time.
+        """
         if min_size is None:
             min_size = Size(0,0)
+        key = (min_size.width, min_size.height)
+        if key in self._measured:
+            return self._measured[key]
+        version = self._version
+        measured = self._calc_size(min_size)
+        if self._version == version:
+            self._measured[key] = measured
+        return measured
+
+    def _calc_size(self, min_size):
+        cum_dim = 0 # size along layout direction
+        max_orth_dim = 0 # size along other direction
 
         # Step 1: calculate required size along self._direction
         if self._direction in [LeftToRight, RightToLeft]:
@@ -479,7 +528,7 @@ class BoxLayout(Layout):
             if isinstance(item,SVGFileNoLayout):
                 item_size = Size(0,0)
             else:
-                item_size = item.get_size(min_size=dim_min_size, box_align=alignment,level=level+1)
+                item_size = item.get_size(min_size=dim_min_size, box_align=alignment)
             item_sizes.append( item_size )
 
             if isinstance(item,SVGFileNoLayout):
@@ -527,6 +576,7 @@ class BoxLayout(Layout):
         cum_dim = 0 # size along layout direction
         cum_dim += self._contents_margins # first margin
         is_last_item = False
+        plan = [] # (box offset from self._coord, box size, item size) per item
         for i,(_item,old_item_size) in enumerate(zip(self._items,item_sizes)):
             if (i+1) >= len(self._items):
                 is_last_item=True
@@ -545,23 +595,21 @@ class BoxLayout(Layout):
             if isinstance(item,SVGFileNoLayout):
                 item_size = Size(0,0)
             else:
-                item_size = item.get_size(min_size=new_item_size, box_align=alignment,level=level+1)
+                item_size = item.get_size(min_size=new_item_size, box_align=alignment)
             if self._direction == LeftToRight:
-                child_box_coord = (cum_dim, self._contents_margins)
+                child_box_offset = (cum_dim, self._contents_margins)
             elif self._direction == TopToBottom:
-                child_box_coord = (self._contents_margins, cum_dim)
+                child_box_offset = (self._contents_margins, cum_dim)
             else:
                 raise NotImplementedError(
                     'direction %s not implemented'%self._direction)
-            child_box_coord = (child_box_coord[0] + self._coord[0],
-                               child_box_coord[1] + self._coord[1])
             child_box_size = new_item_size
 
-            item_pos, final_item_size = self._calc_box( child_box_coord, child_box_size,
+            item_pos, final_item_size = self._calc_box( child_box_offset, child_box_size,
                                                         item_size,
                                                         alignment )
-            item._set_coord( item_pos )
             item._set_size( final_item_size )
+            plan.append( (child_box_offset, child_box_size, item_size) )
 
             if self._direction in [LeftToRight, RightToLeft]:
                 # Use requested item size so ill behaved item doesn't
@@ -576,17 +624,25 @@ class BoxLayout(Layout):
                 cum_dim += self._spacing # space between elements
         cum_dim += self._contents_margins # last margin
 
-        # ---------------------------------
-
-        # Step 3: calculate coordinates of each item
-
         if self._direction in [LeftToRight, RightToLeft]:
             size = Size(cum_dim, max_orth_dim)
         else:
             size = Size(max_orth_dim, cum_dim)
 
-        self._size = size
-        return size
+        return size, plan
+
+    def _arrange(self, plan):
+        """place the items in the boxes of a measurement"""
+        # Step 3: calculate coordinates of each item
+        for (item,stretch,alignment,xml),(offset,child_box_size,item_size) in zip(self._items,plan):
+            child_box_coord = (offset[0] + self._coord[0],
+                               offset[1] + self._coord[1])
+
+            item_pos, final_item_size = self._calc_box( child_box_coord, child_box_size,
+                                                        item_size,
+                                                        alignment )
+            item._set_coord( item_pos )
+            item._set_size( final_item_size )
 
     def _calc_box(self, in_pos, in_sz, item_sz, alignment):
         if (AlignLeft & alignment):
@@ -626,13 +682,16 @@ class BoxLayout(Layout):
 
     def setSpacing(self,spacing):
         self._spacing = spacing
+        self._invalidate()
 
     def addSVG(self, svg_file, stretch=0, alignment=0, xml=None):
         if not isinstance(svg_file,SVGFile):
             svg_file = SVGFile(svg_file)
         if xml is not None:
             xml = etree.XML(xml)
+        svg_file._parent = self
         self._items.append((svg_file,stretch,alignment,xml))
+        self._invalidate()
 
     def addSVGNoLayout(self, svg_file, x=0, y=0, xml=None):
         if not isinstance(svg_file,SVGFileNoLayout):
@@ -641,13 +700,17 @@ class BoxLayout(Layout):
         alignment=0
         if xml is not None:
             xml = etree.XML(xml)
+        svg_file._parent = self
         self._items.append((svg_file,stretch,alignment,xml))
+        self._invalidate()
 
     def addLayout(self, layout, stretch=0):
         assert isinstance(layout,Layout)
         alignment=0 # always expand a layout
         xml=None
+        layout._parent = self
         self._items.append((layout,stretch,alignment,xml))
+        self._invalidate()
 
 class HBoxLayout(BoxLayout):
     def __init__(self, parent=None):
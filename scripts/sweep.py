@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import re
+import time
+import queue
+import itertools
+import threading
+import shutil
+import subprocess
+import hashlib
+import json
+import numpy as np
+from telemetry import Sampler
+from storage_cache import StorageCache, STORAGE_PARAMETERS, storageKey, clearDirectory
+
+DEFAULTS = {
+	"generateIndices": False,
+	"readInputs": True,
+	"parallel": True,
+	"oramsNumber": 64,
+	"oramStorage": "InMemory",
+	"bucketsNumber": 65536,
+	"virtualRequests": True,
+	"beta": 20,
+	"epsilon": 0.693,
+	"useGamma": True,
+	"queries": 20,
+	"count": 0,
+	"levels": 256,
+	"verbosity": "TRACE",
+	"fileLogging": True,
+	"seed": 1305,
+}
+
+# parameters that determine the files a run generates and the ones after it reuse: the storage files and the queryset
+SHARED = STORAGE_PARAMETERS + ["queryset"]
+# bin/main's thread count option: different-threads.sh passes it as -n, its long name is not known
+THREADS = "n"
+
+RESULT = re.compile(r".; \((\d+)\+(\d+)\+(\d+)=(\d+)\) records / query")
+
+
+def parse():
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Run a parameter sweep of bin/main")
+
+	parser.add_argument("--grid", dest="grid", metavar="name=v1,v2", type=parseAssignment, nargs='+', default=[], help=f"Swept parameters and their values.")
+	parser.add_argument("--set", dest="set", metavar="name=value", type=parseAssignment, nargs='+', default=[], help=f"Fixed parameters overriding the defaults.")
+	parser.add_argument("--input", dest="input", metavar="input", type=str, default="UNIFORM-1000000-10000", help=f"A portion of input file name, such as \"UNIFORM-100-1000000\" in \"dataset-UNIFORM-100-1000000.csv\".")
+
+	parser.add_argument("--binary", dest="binary", metavar="binary", type=str, default="../../dp-oram/dp-oram/bin/main", help=f"The executable to run (bin/main or a local stub).")
+	parser.add_argument("--directory", dest="directory", metavar="directory", type=str, default=None, help=f"Working directory of runs (two levels above the binary by default).")
+	parser.add_argument("--cores", dest="cores", metavar="cores", type=int, default=None, help=f"The number of cores to schedule on (all available by default).")
+	parser.add_argument("--cores-per-job", dest="coresPerJob", metavar="cores-per-job", type=int, default=1, help=f"Cores a run needs when it does not set the thread count ({THREADS}).")
+	parser.add_argument("--cache", dest="cache", metavar="cache", type=str, default="../output/sweep-cache", help=f"Directory of memoized results; finished points are not run again.")
+	parser.add_argument("--no-cache", dest="useCache", default=True, help="Run every point, ignoring and not updating the cache", action="store_false")
+	parser.add_argument("--invalidate", dest="invalidate", metavar="name[=value]", type=str, nargs='+', default=[], help=f"Drop cached results having this parameter (with this value) before running.")
+	parser.add_argument("--storage-cache", dest="storageCache", metavar="storage-cache", type=str, default=None, help=f"Directory caching generated storage files by the parameters that affect them (off by default).")
+	parser.add_argument("--storage-budget", dest="storageBudget", metavar="storage-budget", type=float, default=50, help=f"Disk budget of the storage cache in GB; least recently used entries are evicted.")
+	parser.add_argument("--storage-method", dest="storageMethod", metavar="storage-method", type=str, choices=["reflink", "hardlink", "copy"], default="reflink", help=f"How cached storage files are put in place; hardlink is only safe if runs never write them.")
+	parser.add_argument("--adaptive", dest="adaptive", metavar="name=low,high", type=parseAssignment, default=None, help=f"Search this parameter adaptively within the range instead of on a fixed grid.")
+	parser.add_argument("--metric", dest="metric", metavar="metric", type=str, choices=["real", "padding", "noise", "total"], default="total", help=f"Records per ORAM the adaptive search follows.")
+	parser.add_argument("--target", dest="target", metavar="target", type=float, default=None, help=f"Bisect for the smallest value with metric <= target (the metric must decrease with the parameter, as noise does with epsilon); without it, refine where the curve bends most.")
+	parser.add_argument("--tolerance", dest="tolerance", metavar="tolerance", type=float, default=0.02, help=f"Adaptive stop: relative width of the bisection bracket, or curve deviation from linear relative to its range.")
+	parser.add_argument("--budget", dest="budget", metavar="budget", type=int, default=12, help=f"The most runs per adaptive search.")
+	parser.add_argument("--linear", dest="logarithmic", default=True, help="Search the adaptive parameter on a linear, not logarithmic, scale", action="store_false")
+	parser.add_argument("--telemetry", dest="telemetry", metavar="interval", type=float, default=None, help=f"Sample CPU, RSS, faults, context switches and I/O of every run at this interval in seconds.")
+	parser.add_argument("--store", dest="store", metavar="store", type=str, default=None, help=f"SQLite results store to add the results (with telemetry) to.")
+	parser.add_argument("--no-pinning", dest="pinning", default=True, help="Do not pin runs to CPU sets", action="store_false")
+
+	parser.add_argument("-v", "--verbose", dest="verbose", default=False, help="increase output verbosity", action="store_true")
+
+	args = parser.parse_args()
+
+	logging.basicConfig(
+		level=logging.DEBUG if args.verbose else logging.INFO,
+		format='%(asctime)s %(levelname)-8s %(message)s',
+		datefmt='%a, %d %b %Y %H:%M:%S',
+	)
+
+	base = dict(DEFAULTS, dataset=f"dataset-{args.input}", queryset=f"queries-{args.input}-0.5-follow")
+	base.update(dict(args.set))
+
+	binary = os.path.abspath(args.binary)
+	directory = os.path.abspath(args.directory) if args.directory is not None else os.path.dirname(os.path.dirname(binary))
+
+	invalidate = [(item.split("=", 1)[0], parseValue(item.split("=", 1)[1]) if "=" in item else None) for item in args.invalidate]
+
+	if args.adaptive is not None and (not isinstance(args.adaptive[1], list) or len(args.adaptive[1]) != 2):
+		parser.error("--adaptive needs name=low,high")
+	if args.adaptive is not None and args.logarithmic and min(args.adaptive[1]) <= 0:
+		parser.error("--adaptive needs a positive range on the logarithmic scale; use --linear for others")
+	adaptive = (args.adaptive[0], *args.adaptive[1], args.metric, args.target, args.tolerance, args.budget, args.logarithmic) if args.adaptive is not None else None
+
+	storage = (args.storageCache, int(args.storageBudget * 2**30), args.storageMethod) if args.storageCache is not None else None
+
+	return base, dict(args.grid), binary, directory, args.cores, args.coresPerJob, args.pinning, args.cache if args.useCache else None, invalidate, storage, adaptive, args.telemetry, args.store
+
+
+def parseAssignment(value):
+	name, values = value.split("=", 1)
+	return name, [parseValue(item) for item in values.split(",")] if "," in values else parseValue(values)
+
+
+def parseValue(value):
+	for kind in [int, float]:
+		try:
+			return kind(value)
+		except ValueError:
+			pass
+	if value.lower() in ["true", "false"]:
+		return value.lower() == "true"
+	return value
+
+
+def expandGrid(base, grid):
+	"""
+	Cartesian product of the grid values over the base parameters; a scalar grid value is a single point.
+	"""
+	names = list(grid)
+	values = [grid[name] if isinstance(grid[name], list) else [grid[name]] for name in names]
+
+	return [dict(base, **dict(zip(names, point))) for point in itertools.product(*values)]
+
+
+def coresNeeded(parameters, coresPerJob):
+	return int(parameters.get(THREADS, coresPerJob))
+
+
+def estimateCost(parameters):
+	"""
+	Relative run time used to order jobs longest-first: noise records grow as 1/epsilon and every ORAM is processed.
+	"""
+	return (1 + 1 / float(parameters.get("epsilon", 1))) * float(parameters.get("oramsNumber", 1)) / coresNeeded(parameters, 1)
+
+
+def command(binary, parameters):
+	# single-letter names are short options, as in different-threads.sh
+	return [binary] + [item for name, value in parameters.items() for item in [f"-{name}" if len(name) == 1 else f"--{name}", str(value)]]
+
+
+def parseResult(stdout):
+	match = RESULT.search(stdout)
+	if match is None:
+		return None
+	return dict(zip(["real", "padding", "noise", "total"], (int(group) for group in match.groups())))
+
+
+def runJob(binary, directory, parameters, cpus=None, telemetry=None):
+	"""
+	Runs one configuration, pinned to cpus if given. Returns a result dict with the parsed records, duration, exit code and output,
+	and the telemetry report if a sampling interval is given.
+	"""
+	# preexec_fn is not safe with the scheduler's threads running; taskset pins before exec, so bin/main's threads inherit the set
+	pin = cpus is not None and shutil.which("taskset") is not None
+	start = time.time()
+	process = subprocess.Popen(
+		(["taskset", "-c", ",".join(str(cpu) for cpu in sorted(cpus))] if pin else []) + command(binary, parameters),
+		cwd=directory,
+		stdout=subprocess.PIPE,
+		stderr=subprocess.PIPE,
+		universal_newlines=True,
+	)
+	if cpus is not None and not pin:
+		# without taskset, threads bin/main starts before this call keep the full set
+		try:
+			os.sched_setaffinity(process.pid, cpus)
+		except ProcessLookupError:
+			pass
+	if telemetry is not None:
+		with Sampler(process.pid, telemetry) as sampler:
+			stdout, stderr = process.communicate()
+	else:
+		stdout, stderr = process.communicate()
+
+	result = {
+		"parameters": parameters,
+		"records": parseResult(stdout) if process.returncode == 0 and not stderr else None,
+		"duration": time.time() - start,
+		"returncode": process.returncode,
+		"stdout": stdout,
+		"stderr": stderr,
+	}
+	if telemetry is not None:
+		result["telemetry"] = sampler.report()
+
+	return result
+
+
+def fileDigest(path):
+	digest = hashlib.sha256()
+	with open(path, "rb") as file:
+		for block in iter(lambda: file.read(2**20), b""):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def normalizeValue(value):
+	# epsilon=1 from a grid and 1.0 from the adaptive search are the same run
+	if isinstance(value, (int, float)) and not isinstance(value, bool):
+		return str(float(value))
+	return value
+
+
+def resultKey(parameters, version):
+	parameters = {name: normalizeValue(value) for name, value in parameters.items()}
+	return hashlib.sha256(json.dumps({"parameters": parameters, "version": version}, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+	"""
+	Memoized run results, one JSON file per hash of the full parameter dictionary and the binary version.
+	Only successful runs are stored; stdout is kept as a digest.
+	"""
+
+	def __init__(self, directory, version):
+		self._directory = directory
+		self._version = version
+
+	def key(self, parameters):
+		return resultKey(parameters, self._version)
+
+	def get(self, parameters):
+		path = f"{self._directory}/{self.key(parameters)}.json"
+		if not os.path.exists(path):
+			return None
+		with open(path) as file:
+			return json.load(file)
+
+	def put(self, result):
+		if result["records"] is None:
+			return
+		entry = {name: value for name, value in result.items() if name not in ["stdout", "stderr"]}
+		entry["stdoutDigest"] = hashlib.sha256(result["stdout"].encode("utf-8")).hexdigest() if result.get("stdout") is not None else result.get("stdoutDigest")
+		entry["version"] = self._version
+
+		os.makedirs(self._directory, exist_ok=True)
+		path = f"{self._directory}/{self.key(result['parameters'])}.json"
+		with open(f"{path}.tmp", "w") as file:
+			json.dump(entry, file)
+		os.replace(f"{path}.tmp", path)
+
+	def entries(self):
+		if not os.path.isdir(self._directory):
+			logging.warning(f"No result cache at {self._directory}")
+			return
+		for name in os.listdir(self._directory):
+			if name.endswith(".json"):
+				with open(f"{self._directory}/{name}") as file:
+					yield name, json.load(file)
+
+	def invalidate(self, name, value=None):
+		"""
+		Drops entries whose parameters have name (equal to value if given), for any binary version. Returns the number dropped.
+		"""
+		dropped = 0
+		for filename, entry in list(self.entries()):
+			if name in entry["parameters"] and (value is None or normalizeValue(entry["parameters"][name]) == normalizeValue(value)):
+				os.remove(f"{self._directory}/{filename}")
+				dropped += 1
+		return dropped
+
+
+def sharedKey(parameters):
+	return tuple(str(parameters.get(name)) for name in SHARED)
+
+
+def schedule(jobs, execute, cores, coresPerJob, pinning=True, exclusive=False):
+	"""
+	Runs execute(parameters, cpus) for every job, keeping the busy cores within the limit and starting the longest jobs first.
+	Concurrent jobs get disjoint CPU sets. The first job of every SHARED group runs before the rest of the group,
+	since it generates the files they read. If exclusive, jobs of different groups never overlap (they share one storage directory).
+	Returns results in job order.
+	"""
+	available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+	free = available[:cores] if cores is not None else available
+	total = len(free)
+
+	pending = sorted(range(len(jobs)), key=lambda i: -estimateCost(jobs[i]))
+	setups = {}
+	for i in pending:
+		setups.setdefault(sharedKey(jobs[i]), i)
+	setups = set(setups.values())
+	generated = set()
+
+	results = [None] * len(jobs)
+	finished = queue.Queue()
+	running = 0
+	active = None
+
+	def worker(i, cpus):
+		try:
+			finished.put((i, cpus, execute(jobs[i], set(cpus) if pinning else None), None))
+		except Exception as error:
+			finished.put((i, cpus, None, error))
+
+	while len(pending) > 0 or running > 0:
+		# stable sort: the active group first, then the longest jobs
+		for i in sorted(pending, key=lambda i: exclusive and sharedKey(jobs[i]) != active):
+			if i not in setups and sharedKey(jobs[i]) not in generated:
+				continue
+			if exclusive and running > 0 and sharedKey(jobs[i]) != active:
+				continue
+
+			need = min(coresNeeded(jobs[i], coresPerJob), total)
+			if need > len(free):
+				continue
+
+			cpus, free = free[:need], free[need:]
+			pending.remove(i)
+			running += 1
+			active = sharedKey(jobs[i])
+			logging.debug(f"Starting job {i} on CPUs {cpus}: {jobs[i]}")
+			threading.Thread(target=worker, args=(i, cpus), daemon=True).start()
+
+		i, cpus, result, error = finished.get()
+		running -= 1
+		free = sorted(free + cpus)
+		if error is not None:
+			raise error
+
+		results[i] = result
+		generated.add(sharedKey(jobs[i]))
+
+	return results
+
+
+def refine(evaluate, low, high, budget, tolerance, batch, logarithmic=True):
+	"""
+	Samples a curve on [low, high] where it bends most: every round splits the intervals next to the points deviating most
+	from the chord of their neighbours, until no deviation exceeds tolerance (relative to the curve range) or budget points are evaluated.
+	evaluate maps a list of points to a list of values. Returns sorted NumPy arrays of points and values.
+	"""
+	if logarithmic and low <= 0:
+		raise ValueError(f"A logarithmic scale needs a positive range, not [{low}, {high}]")
+	scale, unscale = (np.log, np.exp) if logarithmic else (lambda x: x, lambda x: x)
+	integral = isinstance(low, int) and isinstance(high, int)
+
+	def points(u):
+		x = unscale(np.asarray(u, dtype=np.float64))
+		return np.unique(np.round(x)) if integral else x
+
+	# a third of the budget at most goes on the uniform first grid, the rest on refinement
+	xs = points(np.linspace(scale(low), scale(high), max(3, min(batch, budget // 3))))
+	ys = np.array(evaluate(list(xs)), dtype=np.float64)
+
+	while len(xs) < budget:
+		order = np.argsort(xs)
+		xs, ys = xs[order], ys[order]
+		u = scale(xs)
+
+		span = max(ys.max() - ys.min(), 1e-12)
+		deviation = np.abs(ys[1:-1] - (ys[:-2] + (ys[2:] - ys[:-2]) * (u[1:-1] - u[:-2]) / (u[2:] - u[:-2]))) / span
+		if len(deviation) == 0 or deviation.max() < tolerance:
+			break
+
+		# an interval scores the larger deviation of its ends
+		scores = np.maximum(np.concatenate([[0], deviation]), np.concatenate([deviation, [0]]))
+		chosen = [i for i in np.argsort(-scores)[:min(batch, budget - len(xs))] if scores[i] >= tolerance]
+		candidates = np.setdiff1d(points([(u[i] + u[i + 1]) / 2 for i in chosen]), xs)
+		if len(candidates) == 0:
+			break
+
+		xs = np.concatenate([xs, candidates])
+		ys = np.concatenate([ys, evaluate(list(candidates))])
+
+	order = np.argsort(xs)
+	return xs[order], ys[order]
+
+
+def bisect(evaluate, low, high, target, tolerance, batch, logarithmic=True, budget=None):
+	"""
+	Finds the smallest point in [low, high] with value <= target for a decreasing curve, evaluating batch points per round (k-section).
+	Stops when the bracket is within tolerance of its upper end. Returns the point (None if high misses the target) and all evaluated points and values.
+	"""
+	if logarithmic and low <= 0:
+		raise ValueError(f"A logarithmic scale needs a positive range, not [{low}, {high}]")
+	scale, unscale = (np.log, np.exp) if logarithmic else (lambda x: x, lambda x: x)
+	integral = isinstance(low, int) and isinstance(high, int)
+
+	xs = [low, high]
+	ys = list(evaluate(xs))
+	if ys[1] > target:
+		return None, np.array(xs), np.array(ys)
+	if ys[0] <= target:
+		return low, np.array(xs), np.array(ys)
+
+	while high - low > tolerance * high and (budget is None or len(xs) < budget):
+		count = batch if budget is None else max(1, min(batch, budget - len(xs)))
+		candidates = unscale(np.linspace(scale(low), scale(high), count + 2)[1:-1])
+		candidates = sorted(set(int(round(x)) for x in candidates) - {low, high}) if integral else list(candidates)
+		if len(candidates) == 0:
+			break
+
+		values = evaluate(candidates)
+		xs += candidates
+		ys += list(values)
+		for x, y in zip(candidates, values):
+			if y > target:
+				low = max(low, x)
+			else:
+				high = min(high, x)
+
+	order = np.argsort(xs)
+	return high, np.array(xs)[order], np.array(ys)[order]
+
+
+def formatResult(result):
+	parameters = result["parameters"]
+	records = result["records"]
+	n = parameters["oramsNumber"]
+
+	if records is not None:
+		outcome = f"{records['real'] // n} + {records['padding'] // n} + {records['noise'] // n} = {records['total'] // n}"
+	else:
+		outcome = f"FAILED ({result['returncode']}): {result['stderr'].strip()[:200]}"
+
+	if result.get("telemetry", {}).get("summary"):
+		summary = result["telemetry"]["summary"]
+		outcome += f"  (CPU {summary['cpuMean']:.1f} mean / {summary['cpuPeak']:.1f} peak, RSS {summary['rssPeak'] / 2**20:.0f} MB peak, {summary['majorFaults']} major faults)"
+
+	beta = f"2^{{-{parameters['beta']}}}"
+	return f"{n:<10}{parameters['bucketsNumber']:<10}{beta:<10}{parameters['epsilon']:<10}{str(parameters['useGamma']):<10}{parameters['levels']:<10}{result['duration']:<10.1f}{outcome}"
+
+
+def main():
+
+	base, grid, binary, directory, cores, coresPerJob, pinning, cache, invalidate, storage, adaptive, telemetry, store = parse()
+
+	version = fileDigest(binary)
+	if cache is not None:
+		cache = ResultCache(cache, version)
+		for name, value in invalidate:
+			logging.info(f"Invalidated {cache.invalidate(name, value)} cached results with {name}{f'={value}' if value is not None else ''}")
+
+	if storage is not None:
+		storageDirectory = f"{directory}/storage-files"
+		storage = StorageCache(*storage)
+		storageLock = threading.Lock()
+		current = [None]
+
+	def execute(parameters, cpus):
+		if storage is not None:
+			# groups never overlap, so only a group's first run swaps the storage directory
+			with storageLock:
+				if current[0] != storageKey(parameters):
+					clearDirectory(storageDirectory)
+					hit = storage.restore(parameters, storageDirectory)
+					logging.debug(f"Storage cache {'hit' if hit else 'miss'} for {parameters}")
+					current[0] = storageKey(parameters)
+
+		result = runJob(binary, directory, parameters, cpus, telemetry)
+		if "telemetry" in result:
+			logging.debug(f"Telemetry of {parameters}: {result['telemetry']['summary']}")
+
+		if storage is not None and result["returncode"] == 0:
+			with storageLock:
+				if not storage.has(parameters):
+					storage.store(parameters, storageDirectory)
+		if cache is not None:
+			cache.put(result)
+		return result
+
+	def run(jobs):
+		results = [cache.get(parameters) for parameters in jobs] if cache is not None else [None] * len(jobs)
+
+		missing = [i for i in range(len(jobs)) if results[i] is None]
+		logging.info(f"Running {len(missing)} of {len(jobs)} configurations of {binary} ({len(jobs) - len(missing)} cached)")
+
+		for i, result in zip(missing, schedule([jobs[i] for i in missing], execute, cores, coresPerJob, pinning=pinning, exclusive=storage is not None)):
+			results[i] = result
+		return results
+
+	jobs = expandGrid(base, grid)
+
+	if adaptive is None:
+		results = run(jobs)
+	else:
+		name, low, high, metric, target, tolerance, budget, logarithmic = adaptive
+		available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+		batch = max(1, (cores if cores is not None else available) // coresPerJob)
+
+		results = []
+		for parameters in jobs:
+			evaluated = []
+
+			def evaluate(points):
+				points = [type(low)(point) if isinstance(low, int) else round(float(point), 6) for point in points]
+				batchResults = run([dict(parameters, **{name: point}) for point in points])
+				for result in batchResults:
+					if result["records"] is None:
+						raise RuntimeError(f"Execution failed for {result['parameters']}: {result['stderr'].strip()[:200]}")
+				evaluated.extend(batchResults)
+				return [result["records"][metric] / int(parameters["oramsNumber"]) for result in batchResults]
+
+			if target is not None:
+				answer, _, _ = bisect(evaluate, low, high, target, tolerance, batch, logarithmic, budget)
+				logging.info(f"Smallest {name} with {metric} <= {target} records per ORAM: {f'{answer:g}' if answer is not None else f'none up to {high}'} ({len(evaluated)} runs)")
+			else:
+				xs, _ = refine(evaluate, low, high, budget, tolerance, batch, logarithmic)
+				logging.info(f"Sampled {len(xs)} values of {name} in [{low}, {high}] ({len(evaluated)} runs)")
+			results += evaluated
+
+	if store is not None:
+		from results import ResultStore
+
+		store = ResultStore(store)
+		for result in results:
+			store.add(result, key=resultKey(result["parameters"], version))
+		store.close()
+
+	print(f"{'ORAMs':<10}{'Buckets':<10}{'beta':<10}{'epsilon':<10}{'gamma':<10}{'levels':<10}{'time, s':<10}Results per ORAM (real+padding+noise=total)")
+	for result in sorted(results, key=lambda result: [float(result["parameters"][name]) for name in ["bucketsNumber", "beta", "epsilon"]]):
+		print(formatResult(result))
+
+
+if __name__ == "__main__":
+	main()
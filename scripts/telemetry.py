@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+"""
+Samples the resource usage of a running process and its descendants from /proc/<pid>: CPU time, RSS,
+major faults, context switches and bytes read and written, at a fixed interval on a background thread.
+"""
+
+import os
+import glob
+import time
+import threading
+import numpy as np
+
+TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+FIELDS = ["time", "cpu", "rss", "majorFaults", "contextSwitches", "readBytes", "writeBytes"]
+
+
+def readProc(files):
+	"""
+	One sample from open /proc/<pid> stat and io files (io may be None when not readable) and the task directory.
+	CPU time, major faults and I/O include the children the process has waited for; context switches are summed over its live threads.
+	"""
+	stat, tasks, io = files
+
+	stat.seek(0)
+	# the command name may contain spaces; fields resume after its closing parenthesis
+	fields = stat.read().rsplit(")", 1)[1].split()
+	cpu = (int(fields[11]) + int(fields[12]) + int(fields[13]) + int(fields[14])) / TICKS
+	majorFaults = int(fields[9]) + int(fields[10])
+	rss = int(fields[21]) * PAGE
+
+	# /proc/<pid>/status counts the main thread only
+	contextSwitches = 0
+	for path in glob.glob(f"{tasks}/*/status"):
+		try:
+			with open(path) as status:
+				for line in status:
+					if "ctxt_switches:" in line:
+						contextSwitches += int(line.split()[1])
+		except OSError:
+			# the thread exited
+			pass
+
+	readBytes = writeBytes = 0
+	if io is not None:
+		io.seek(0)
+		for line in io:
+			if line.startswith("read_bytes:"):
+				readBytes = int(line.split()[1])
+			elif line.startswith("write_bytes:"):
+				writeBytes = int(line.split()[1])
+
+	return [time.time(), cpu, rss, majorFaults, contextSwitches, readBytes, writeBytes]
+
+
+def openProc(pid):
+	"""
+	Open /proc/<pid> stat and io files for readProc, with the task directory, or None if the process is gone.
+	"""
+	try:
+		stat = open(f"/proc/{pid}/stat")
+	except OSError:
+		return None
+	try:
+		io = open(f"/proc/{pid}/io")
+	except OSError:
+		io = None
+	return stat, f"/proc/{pid}/task", io
+
+
+def closeProc(files):
+	stat, _, io = files
+	for file in [stat, io]:
+		if file is not None:
+			file.close()
+
+
+def descendants(pid):
+	"""
+	Pids of the live descendants of a process: from /proc/<pid>/task/*/children where the kernel provides it, otherwise from the parent pids in /proc/*/stat.
+	"""
+	if os.path.exists(f"/proc/self/task/{os.getpid()}/children"):
+		def children(parent):
+			found = []
+			for path in glob.glob(f"/proc/{parent}/task/*/children"):
+				try:
+					with open(path) as file:
+						found += [int(child) for child in file.read().split()]
+				except OSError:
+					pass
+			return found
+	else:
+		parents = {}
+		for name in os.listdir("/proc"):
+			if name.isdigit():
+				try:
+					with open(f"/proc/{name}/stat") as file:
+						parents.setdefault(int(file.read().rsplit(")", 1)[1].split()[1]), []).append(int(name))
+				except (OSError, IndexError, ValueError):
+					pass
+
+		def children(parent):
+			return parents.get(parent, [])
+
+	found = []
+	stack = [pid]
+	while len(stack) > 0:
+		for child in children(stack.pop()):
+			if child not in found:
+				found += [child]
+				stack += [child]
+	return found
+
+
+class Sampler(object):
+	"""
+	Background sampler of processes and, unless disabled, everything they fork, summed per sample; use as a context manager around their lifetime.
+	Sampling stops when the first process exits.
+	"""
+
+	def __init__(self, pid, interval=0.5, children=True):
+		self._pids = list(pid) if isinstance(pid, (list, tuple)) else [pid]
+		self._interval = interval
+		self._children = children
+		self._samples = []
+		self._stop = threading.Event()
+		self._thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exception):
+		self.stop()
+
+	def start(self):
+		self._thread = threading.Thread(target=self._run, daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join()
+
+	def _sample(self, files):
+		"""
+		One summed sample; the descendants' files are opened and closed as they come and go.
+		"""
+		pids = list(self._pids)
+		if self._children:
+			pids += [child for pid in self._pids for child in descendants(pid) if child not in pids]
+
+		for pid in list(files):
+			if pid not in pids:
+				closeProc(files.pop(pid))
+
+		samples = []
+		for pid in pids:
+			if pid not in files:
+				opened = openProc(pid)
+				if opened is None:
+					if pid in self._pids:
+						raise ProcessLookupError(pid)
+					continue
+				files[pid] = opened
+			try:
+				samples += [readProc(files[pid])]
+			except (OSError, IndexError, ValueError):
+				if pid in self._pids:
+					raise
+				# a descendant exited between listing and reading
+				closeProc(files.pop(pid))
+
+		total = np.sum(samples, axis=0)
+		total[0] = time.time()
+		return total.tolist()
+
+	def _run(self):
+		files = {}
+		try:
+			while True:
+				try:
+					self._samples += [self._sample(files)]
+				except (OSError, ProcessLookupError, IndexError, ValueError):
+					# the process exited
+					break
+				if self._stop.wait(self._interval):
+					break
+		finally:
+			for opened in files.values():
+				closeProc(opened)
+
+	def series(self):
+		"""
+		Samples as a dict of NumPy arrays: time is relative to the first sample, cpu is the utilization (cores busy) over the preceding interval.
+		"""
+		samples = np.array(self._samples, dtype=np.float64).reshape(-1, len(FIELDS))
+		series = dict(zip(FIELDS, samples.T.copy()))
+
+		if len(samples) > 0:
+			cpu = series["cpu"]
+			series["cpu"] = np.concatenate([[0], np.diff(cpu) / np.maximum(np.diff(series["time"]), 1e-9)])
+			series["time"] = series["time"] - series["time"][0]
+
+		return series
+
+	def summary(self):
+		"""
+		Peak and mean of utilization and RSS, and how much the counters grew from the first to the last sample.
+		Counters of descendants that exit before the end drop out of the sums unless their parent has waited for them.
+		"""
+		series = self.series()
+		if len(series["time"]) == 0:
+			return {}
+
+		return {
+			"samples": len(series["time"]),
+			"cpuPeak": float(series["cpu"].max()),
+			"cpuMean": float(series["cpu"][1:].mean()) if len(series["cpu"]) > 1 else 0.0,
+			"rssPeak": int(series["rss"].max()),
+			"rssMean": float(series["rss"].mean()),
+			**{name: int(series[name][-1] - series[name][0]) for name in ["majorFaults", "contextSwitches", "readBytes", "writeBytes"]},
+		}
+
+	def report(self):
+		"""
+		JSON-friendly telemetry: the series as lists and the summary.
+		"""
+		return {
+			"interval": self._interval,
+			"series": {name: values.tolist() for name, values in self.series().items()},
+			"summary": self.summary(),
+		}
@@ -4,18 +4,56 @@ import numpy as np
 import random
 import logging
 import os
+import mmap
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum, auto
+
+CHUNK = 2**26
+BUFFER = 2**24
+# bytes per input and step of the sequential zip; its index arrays take several times that
+ZIP_CHUNK = 2**18
+NEWLINE = ord("\n")
+# what bytes.rstrip strips besides the newline
+WHITESPACE = np.frombuffer(b" \t\r\x0b\x0c", dtype=np.uint8)
+
+
+class Interleave(Enum):
+	ROUNDROBIN = auto()
+	WEIGHTED = auto()
+	BLOCKS = auto()
+
+	def __str__(self):
+		return self.name
+
+	@staticmethod
+	def from_string(s):
+		try:
+			return Interleave[s]
+		except KeyError:
+			raise ValueError()
 
 
 def parse():
 	import argparse
 
-	parser = argparse.ArgumentParser(description="Expand distribution")
+	parser = argparse.ArgumentParser(description="Zip datasets and querysets of several attributes")
+
+	parser.add_argument("--datasets", dest="datasets", metavar="datasets", type=str, nargs='+', default=[], help=f"The dataset files, one per attribute.")
+	parser.add_argument("--querysets", dest="querysets", metavar="querysets", type=str, nargs='+', default=[], help=f"The queryset files, one per attribute.")
+
+	parser.add_argument("--left-dataset", dest="leftDataset", metavar="left-dataset", type=str, required=False, help=f"The left dataset file (same as the first of --datasets).")
+	parser.add_argument("--right-dataset", dest="rightDataset", metavar="right-dataset", type=str, required=False, help=f"The right dataset file (same as the second of --datasets).")
+
+	parser.add_argument("--left-queryset", dest="leftQueryset", metavar="left-queryset", type=str, required=False, help=f"The left queryset file (same as the first of --querysets).")
+	parser.add_argument("--right-queryset", dest="rightQueryset", metavar="right-queryset", type=str, required=False, help=f"The right queryset file (same as the second of --querysets).")
 
-	parser.add_argument("--left-dataset", dest="leftDataset", metavar="left-dataset", type=argparse.FileType("r"), required=True, help=f"The left dataset file.")
-	parser.add_argument("--right-dataset", dest="rightDataset", metavar="right-dataset", type=argparse.FileType("r"), required=True, help=f"The right dataset file.")
+	parser.add_argument("--interleave", dest="interleave", metavar="interleave", type=lambda interleave: Interleave[interleave], choices=list(Interleave), default=Interleave.ROUNDROBIN, help=f"How to interleave querysets.")
+	parser.add_argument("--weights", dest="weights", metavar="weights", type=float, nargs='+', default=[], help=f"Queryset weights for WEIGHTED interleaving (uniform by default).")
+	parser.add_argument("--block", dest="block", metavar="block", type=int, default=1, help=f"The number of consecutive queries from one queryset for BLOCKS interleaving.")
 
-	parser.add_argument("--left-queryset", dest="leftQueryset", metavar="left-queryset", type=argparse.FileType("r"), required=True, help=f"The left queryset file.")
-	parser.add_argument("--right-queryset", dest="rightQueryset", metavar="right-queryset", type=argparse.FileType("r"), required=True, help=f"The right queryset file.")
+	parser.add_argument("--processes", dest="processes", metavar="processes", type=int, default=1, help=f"The number of processes zipping datasets in parallel chunks. 1 to stream sequentially.")
+	parser.add_argument("--binary", dest="binary", default=False, help="Also write each dataset column as raw float64 (dataset-merged-<i>.bin)", action="store_true")
 
 	parser.add_argument("--seed", dest="seed", metavar="seed", type=int, default=123456, required=False, help="Seed to use for PRG")
 	parser.add_argument("-v", "--verbose", dest="verbose", default=False, help="increase output verbosity", action="store_true")
@@ -31,40 +69,271 @@ def parse():
 	random.seed(args.seed)
 	np.random.seed(args.seed + 1)
 
-	return args.leftDataset, args.rightDataset, args.leftQueryset, args.rightQueryset
+	datasets = [path for path in [args.leftDataset, args.rightDataset] if path is not None] + args.datasets
+	querysets = [path for path in [args.leftQueryset, args.rightQueryset] if path is not None] + args.querysets
+
+	if len(datasets) < 2 or len(querysets) < 2:
+		parser.error("at least two datasets and two querysets are required")
+	if args.interleave == Interleave.WEIGHTED and len(args.weights) not in [0, len(querysets)]:
+		parser.error("--weights must have one weight per queryset")
+
+	return datasets, querysets, args.interleave, args.weights, args.block, args.processes, args.binary
+
+
+def readColumns(files):
+	"""
+	Reads all files in chunks and yields, per step, one uint8 buffer per file holding the same number of complete lines,
+	with the positions of their newlines. Only the files with the fewest buffered lines are read, so no buffer outgrows
+	a chunk much. Raises ValueError as soon as one file runs out of lines before the others.
+	"""
+	buffers = [np.empty(0, dtype=np.uint8) for _ in files]
+	newlines = [np.empty(0, dtype=np.int64) for _ in files]
+	finished = [False] * len(files)
+
+	while True:
+		fewest = min(len(positions) for positions in newlines)
+		for i, file in enumerate(files):
+			if finished[i] or len(newlines[i]) > fewest:
+				continue
+			data = np.frombuffer(file.read(ZIP_CHUNK), dtype=np.uint8)
+			if len(data) == 0:
+				finished[i] = True
+				# a last line without a trailing newline counts too
+				if len(buffers[i]) > 0 and buffers[i][-1] != NEWLINE:
+					data = np.array([NEWLINE], dtype=np.uint8)
+			newlines[i] = np.concatenate((newlines[i], np.flatnonzero(data == NEWLINE) + len(buffers[i])))
+			buffers[i] = np.concatenate((buffers[i], data))
+
+		ready = min(len(positions) for positions in newlines)
+		if ready > 0:
+			cuts = [positions[ready - 1] + 1 for positions in newlines]
+			yield [buffer[:cut] for buffer, cut in zip(buffers, cuts)], [positions[:ready] for positions in newlines]
+			buffers = [buffer[cut:] for buffer, cut in zip(buffers, cuts)]
+			newlines = [positions[ready:] - cut for positions, cut in zip(newlines, cuts)]
+		elif all(finished[i] for i in range(len(files)) if len(newlines[i]) == 0):
+			# a file without lines left has ended; the others must have ended too
+			if all(finished) and all(len(buffer) == 0 for buffer in buffers):
+				return
+			raise ValueError("Inputs have different numbers of lines")
+
+
+def zipBuffers(buffers, newlines):
+	"""
+	Line k of every buffer, right-stripped like bytes.rstrip, joined by commas, as one uint8 array.
+	The bytes are moved by vectorized gathers, without an object per line.
+	"""
+	starts = [np.concatenate(([0], positions[:-1] + 1)) for positions in newlines]
+	ends = [positions.copy() for positions in newlines]
+	for buffer, start, end in zip(buffers, starts, ends):
+		while True:
+			strip = (end > start) & np.isin(buffer[np.maximum(end - 1, 0)], WHITESPACE)
+			if not strip.any():
+				break
+			end -= strip
+
+	lengths = [end - start for start, end in zip(starts, ends)]
+	# every column is followed by a comma, the last one by the newline
+	widths = sum(lengths) + len(buffers)
+	offsets = np.cumsum(widths) - widths
+
+	out = np.full(int(widths.sum()), ord(","), dtype=np.uint8)
+	out[offsets + widths - 1] = NEWLINE
+	for buffer, start, length in zip(buffers, starts, lengths):
+		total = int(length.sum())
+		source = np.arange(total) + np.repeat(start - (np.cumsum(length) - length), length)
+		out[source + np.repeat(offsets - start, length)] = buffer[source]
+		offsets += length + 1
+
+	return out
+
+
+def zipDatasets(datasets, output, binary):
+	counter = 0
+	outputs = [output] + ([f"{os.path.splitext(output)[0]}-{i}.bin" for i in range(len(datasets))] if binary else [])
+	files = [open(dataset, "rb") for dataset in datasets]
+	columns = [open(path, "wb", buffering=BUFFER) for path in outputs[1:]]
+
+	try:
+		# steps are written whole, a write buffer would only copy them
+		with open(output, "wb") as out:
+			for buffers, newlines in readColumns(files):
+				out.write(zipBuffers(buffers, newlines))
+
+				for column, buffer in zip(columns, buffers):
+					values = np.array(buffer.tobytes().split()).astype(np.float64)
+					if len(values) != len(newlines[0]):
+						raise ValueError("Blank lines cannot be written as binary columns")
+					column.write(values.tobytes())
+
+				counter += len(newlines[0])
+	except ValueError:
+		for file in columns:
+			file.close()
+		for path in outputs:
+			os.remove(path)
+		raise
+	finally:
+		for file in files + columns:
+			file.close()
+
+	return counter
+
+
+def countLines(path):
+	"""
+	Returns the number of lines and the file size; a last line without a trailing newline counts too.
+	"""
+	size = os.path.getsize(path)
+	if size == 0:
+		return 0, 0
+
+	with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		lines = 0
+		for start in range(0, size, CHUNK):
+			lines += data[start:start + CHUNK].count(b"\n")
+		if data[size - 1:size] != b"\n":
+			lines += 1
+
+	return lines, size
+
+
+def lineOffsets(path, targets):
+	"""
+	Byte offsets of the starts of the given (sorted) line numbers.
+	"""
+	size = os.path.getsize(path)
+	offsets = []
+
+	with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		seen = 0
+		for start in range(0, size, CHUNK):
+			newlines = np.flatnonzero(np.frombuffer(data[start:start + CHUNK], dtype=np.uint8) == ord("\n"))
+			while len(offsets) < len(targets) and targets[len(offsets)] <= seen + len(newlines):
+				line = targets[len(offsets)]
+				offsets += [0 if line == 0 else start + newlines[line - seen - 1] + 1]
+			seen += len(newlines)
+
+	return offsets + [size] * (len(targets) - len(offsets))
+
+
+def zipChunk(paths, starts, ends, output, binary):
+	"""
+	Zips the byte ranges [starts[i], ends[i]) of the inputs, which hold the same lines of every file, into output (and binary column parts).
+	"""
+	chunk = []
+	for path, start, end in zip(paths, starts, ends):
+		with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			lines = data[start:end]
+		# only the newline ending the range; blank lines before it are lines too, as countLines counts them
+		if lines.endswith(b"\n"):
+			lines = lines[:-1]
+		chunk += [[line.rstrip() for line in lines.split(b"\n")] if end > start else []]
+
+	with open(output, "wb", buffering=BUFFER) as out:
+		if len(chunk[0]) > 0:
+			out.write(b"\n".join(map(b",".join, zip(*chunk))))
+			out.write(b"\n")
+
+	if binary:
+		for i, lines in enumerate(chunk):
+			with open(f"{output}-{i}.bin", "wb", buffering=BUFFER) as column:
+				column.write(np.array(lines).astype(np.float64).tobytes())
+
+	return len(chunk[0])
+
+
+def concatenate(parts, output):
+	with open(output, "wb") as out:
+		for part in parts:
+			with open(part, "rb") as file:
+				shutil.copyfileobj(file, out, BUFFER)
+			os.remove(part)
+
+
+def zipDatasetsParallel(datasets, output, binary, processes):
+	"""
+	Splits every input at the same line numbers, zips the chunks in a process pool and concatenates the parts.
+	"""
+	with ProcessPoolExecutor(max_workers=processes) as pool:
+		counts = list(pool.map(countLines, datasets))
+
+		lines = [count[0] for count in counts]
+		if len(set(lines)) != 1:
+			raise ValueError(f"Inputs have different numbers of lines: {dict(zip(datasets, lines))}")
+
+		chunks = max(1, min(processes * 4, lines[0]))
+		targets = [lines[0] * k // chunks for k in range(chunks)]
+		offsets = list(pool.map(lineOffsets, datasets, [targets] * len(datasets)))
+		offsets = [fileOffsets + [size] for fileOffsets, (_, size) in zip(offsets, counts)]
+
+		parts = [f"{output}.part-{k}" for k in range(chunks)]
+		counter = sum(pool.map(
+			zipChunk,
+			[datasets] * chunks,
+			[[fileOffsets[k] for fileOffsets in offsets] for k in range(chunks)],
+			[[fileOffsets[k + 1] for fileOffsets in offsets] for k in range(chunks)],
+			parts,
+			[binary] * chunks,
+		))
+
+	concatenate(parts, output)
+	if binary:
+		for i in range(len(datasets)):
+			concatenate([f"{part}-{i}.bin" for part in parts], f"{os.path.splitext(output)[0]}-{i}.bin")
+
+	return counter
+
+
+def interleaveOrder(sizes, interleave, weights, block):
+	"""
+	Returns a list of (queryset, line) pairs in output order, stopping as soon as a queryset runs out.
+	"""
+	order = []
+	taken = [0] * len(sizes)
+
+	if interleave == Interleave.WEIGHTED:
+		weights = np.array(weights if len(weights) > 0 else [1.0] * len(sizes))
+		sources = np.random.choice(len(sizes), size=sum(sizes), p=weights / weights.sum())
+	else:
+		step = block if interleave == Interleave.BLOCKS else 1
+		sources = np.repeat(np.tile(np.arange(len(sizes)), sum(sizes) // step + 1), step)
+
+	for source in sources:
+		if taken[source] == sizes[source]:
+			break
+		order += [(source, taken[source])]
+		taken[source] += 1
+
+	return order
+
+
+def zipQuerysets(querysets, output, interleave, weights, block):
+	lines = []
+	for queryset in querysets:
+		with open(queryset, "rb") as file:
+			lines += [file.read().rstrip(b"\n").split(b"\n")]
+
+	order = interleaveOrder([len(queries) for queries in lines], interleave, weights, block)
+
+	with open(output, "wb", buffering=BUFFER) as out:
+		out.write(b"".join(lines[source][line].rstrip() + b"\n" for source, line in order))
+
+	return len(order)
 
 
 def main():
 
-	leftDataset, rightDataset, leftQueryset, rightQueryset = parse()
+	datasets, querysets, interleave, weights, block, processes, binary = parse()
 	cwd = os.path.dirname(os.path.abspath(__file__))
 
-	counter = 0
-	with leftDataset as leftIn:
-		with rightDataset as rightIn:
-			with open(f"{cwd}/../output/dataset-merged.csv", "w") as out:
-				while True:
-					leftLine = leftIn.readline()
-					rightLine = rightIn.readline()
-					if not leftLine or not rightLine:
-						break
-					out.write(f"{leftLine.rstrip()},{rightLine.rstrip()}\n")
-					counter += 1
+	if processes > 1:
+		counter = zipDatasetsParallel(datasets, f"{cwd}/../output/dataset-merged.csv", binary, processes)
+	else:
+		counter = zipDatasets(datasets, f"{cwd}/../output/dataset-merged.csv", binary)
 
 	logging.info(f"Written {counter} dataset lines!")
 
-	counter = 0
-	with leftQueryset as leftIn:
-		with rightQueryset as rightIn:
-			with open(f"{cwd}/../output/queryset-merged.csv", "w") as out:
-				while True:
-					leftLine = leftIn.readline()
-					rightLine = rightIn.readline()
-					if not leftLine or not rightLine:
-						break
-					out.write(f"{leftLine.rstrip()}\n")
-					out.write(f"{rightLine.rstrip()}\n")
-					counter += 2
+	counter = zipQuerysets(querysets, f"{cwd}/../output/queryset-merged.csv", interleave, weights, block)
 
 	logging.info(f"Written {counter} queryset lines!")
 